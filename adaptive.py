@@ -0,0 +1,155 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+from aggregate import result_scores
+from simulation import CHUNK_SIZE, iter_simulate
+
+BATCH_SIZE = 200  # travelers between two precision checks
+MAX_TRAVELERS = 100000
+CONFIDENCE = 0.95
+
+
+# Wilson score interval of a proportion
+def wilson_interval(nb_successes, nb_trials, z):
+    if nb_trials == 0:
+        return 0.0, 1.0
+    p = nb_successes / nb_trials
+    center = (p + z**2 / (2 * nb_trials)) / (1 + z**2 / nb_trials)
+    half_width = z * math.sqrt(p * (1 - p) / nb_trials + z**2 / (4 * nb_trials**2)) / (1 + z**2 / nb_trials)
+    return max(center - half_width, 0.0), min(center + half_width, 1.0)
+
+
+# distribution free interval of the q quantile: the order statistics whose ranks are the binomial bounds of n * q
+def quantile_interval(sorted_scores, q, z):
+    n = len(sorted_scores)
+    spread = z * math.sqrt(n * q * (1 - q))
+    low = min(max(math.floor(n * q - spread), 0), n - 1)
+    high = min(max(math.ceil(n * q + spread), 0), n - 1)
+    return sorted_scores[low], sorted_scores[high]
+
+
+# estimates and confidence intervals of the mean and quantiles of the total score of the travelers that did not fail,
+# and of the failure rate
+def precision(totals, nb_failed, quantiles=(), confidence=CONFIDENCE):
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    nb_travelers = len(totals) + nb_failed
+    report = {"nb_travelers": nb_travelers, "confidence": confidence}
+    low, high = wilson_interval(nb_failed, nb_travelers, z)
+    report["failure_rate"] = {"estimate": nb_failed / max(nb_travelers, 1), "low": low, "high": high}
+
+    scores = np.sort(totals)
+    if len(scores) > 1:
+        mean = float(scores.mean())
+        half_width = z * float(scores.std(ddof=1)) / math.sqrt(len(scores))
+        report["mean"] = {"estimate": mean, "low": mean - half_width, "high": mean + half_width}
+    else:
+        report["mean"] = {"estimate": float("nan"), "low": -math.inf, "high": math.inf}
+    report["quantiles"] = {}
+    for q in quantiles:
+        if len(scores) == 0:
+            report["quantiles"][q] = {"estimate": float("nan"), "low": -math.inf, "high": math.inf}
+            continue
+        low, high = quantile_interval(scores, q, z)
+        report["quantiles"][q] = {"estimate": float(np.quantile(scores, q)), "low": float(low), "high": float(high)}
+    return report
+
+
+def _half_width(interval):
+    return (interval["high"] - interval["low"]) / 2
+
+
+# True when every interval with a tolerance is at most that wide on each side of its estimate
+def tolerances_met(report, mean_tolerance=None, quantile_tolerances=None, failure_tolerance=None):
+    if mean_tolerance is not None and not _half_width(report["mean"]) <= mean_tolerance:
+        return False
+    if failure_tolerance is not None and not _half_width(report["failure_rate"]) <= failure_tolerance:
+        return False
+    for q, tolerance in (quantile_tolerances or {}).items():
+        if not _half_width(report["quantiles"][q]) <= tolerance:
+            return False
+    return True
+
+
+# simulation.iter_simulate that stops once the confidence intervals of the total score are as narrow as the given
+# tolerances (half widths, in score points for the mean and quantile_tolerances {q: tolerance}, as a probability for
+# the failure rate), checked every batch_size travelers. Returns the precision report with the number of travelers
+# used and converged, False when max_travelers was reached first. The travelers used only depend on seed
+def simulate_until(
+    simulate_one,
+    seed=None,
+    nb_workers=None,
+    mean_tolerance=None,
+    quantile_tolerances=None,
+    failure_tolerance=None,
+    confidence=CONFIDENCE,
+    batch_size=BATCH_SIZE,
+    max_travelers=MAX_TRAVELERS,
+    **kwargs,
+):
+    quantiles = sorted(quantile_tolerances or {})
+    totals = []
+    nb_failed = 0
+    report = precision(totals, nb_failed, quantiles, confidence)
+    results = iter_simulate(
+        simulate_one, max_travelers, seed, nb_workers, chunk_size=min(CHUNK_SIZE, batch_size), **kwargs
+    )
+    try:
+        for i, result in enumerate(results, 1):
+            scores = result_scores(result)
+            if scores is None:
+                nb_failed += 1
+            else:
+                totals.append(float(scores.sum()))
+            if i % batch_size == 0 or i == max_travelers:
+                report = precision(totals, nb_failed, quantiles, confidence)
+                if tolerances_met(report, mean_tolerance, quantile_tolerances, failure_tolerance):
+                    report["converged"] = True
+                    return report
+    finally:
+        results.close()
+    report["converged"] = False
+    return report
+
+
+# simulate_until for every configuration (dict of keyword arguments of simulate_one), each one stops on its own.
+# Configuration i gets child i of SeedSequence(seed)
+def simulate_configs_until(simulate_one, configs, seed=None, **options):
+    seeds = np.random.SeedSequence(seed).spawn(len(configs))
+    return [simulate_until(simulate_one, seed=s, **options, **config) for config, s in zip(configs, seeds)]
+
+
+if __name__ == "__main__":
+    import time
+
+    from artifact import TYPES
+    from simulation import run_traveler
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    configs = [
+        dict(
+            desired_main_statuses=desired_main_statuses,
+            desired_sub_status="ATK%",
+            weeks=weeks,
+            free_artifacts={artifact_type: 0 for artifact_type in TYPES},
+        )
+        for weeks in (2, 8)
+    ]
+    start = time.perf_counter()
+    reports = simulate_configs_until(
+        run_traveler,
+        configs,
+        seed=0,
+        mean_tolerance=1.0,
+        quantile_tolerances={0.1: 2.0, 0.9: 2.0},
+        failure_tolerance=0.02,
+    )
+    for config, report in zip(configs, reports):
+        print(
+            f"{config['weeks']} weeks: {report['nb_travelers']} travelers, converged {report['converged']}, "
+            f"mean {report['mean']['estimate']:.2f} +- {_half_width(report['mean']):.2f}, "
+            f"failure rate {report['failure_rate']['estimate']:.3f} +- {_half_width(report['failure_rate']):.3f}"
+        )
+        for q, interval in report["quantiles"].items():
+            print(f"  q{q}: {interval['estimate']:.2f} in [{interval['low']:.2f}, {interval['high']:.2f}]")
+    print(f"{time.perf_counter() - start:.1f} s")
@@ -0,0 +1,214 @@
+import ast
+import os
+import random
+
+import numpy as np
+from artifact import TYPES
+
+SCORE_BINS = np.arange(0, 301)  # 1 point wide bins for total scores
+SKETCH_CAPACITY = 256
+SPILL_CHUNK_SIZE = 1000
+NPY_HEADER_SIZE = 128  # fixed so the shape can be rewritten in place when rows are appended
+
+
+# score of each type from a Traveler.get_scores or Player.get_max_scores result, None if the traveler failed
+def result_scores(result):
+    if result is None or len(result) == 0:
+        return None
+    if isinstance(result, tuple):
+        return np.array([result[1][artifact_type] for artifact_type in TYPES], dtype=float)
+    return np.asarray(result, dtype=float)
+
+
+class RunningStats:
+    # count, mean and variance in one pass (Welford), two of them can be merged (Chan et al.)
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+
+class Histogram:
+    # counts in fixed bins, values outside the bins are counted in under/over
+    def __init__(self, bins=SCORE_BINS):
+        self.bins = np.asarray(bins, dtype=float)
+        self.counts = np.zeros(len(self.bins) - 1, dtype=np.int64)
+        self.under = 0
+        self.over = 0
+
+    def add(self, x):
+        if x < self.bins[0]:
+            self.under += 1
+        elif x >= self.bins[-1]:
+            self.over += 1
+        else:
+            self.counts[np.searchsorted(self.bins, x, side="right") - 1] += 1
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.under += other.under
+        self.over += other.over
+        return self
+
+
+class QuantileSketch:
+    # KLL style sketch: level i keeps items of weight 2**i, a full level is sorted and the odd or the even items, drawn
+    # at random, are promoted to the next level. Memory is O(capacity * log(n / capacity)) and sketches can be merged.
+    # The random choices keep the quantiles unbiased whatever the order of the items, seed makes them reproducible
+    def __init__(self, capacity=SKETCH_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.levels = [[]]
+        self.rng = random.Random(seed)
+
+    def add(self, x):
+        self.levels[0].append(x)
+        if len(self.levels[0]) > self.capacity:
+            self._compact()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append([])
+            self.levels[level].extend(items)
+        self._compact()
+        return self
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.capacity:
+                items = sorted(self.levels[level])
+                if len(items) % 2 == 1:  # keep a random item at this level so the total weight does not change
+                    self.levels[level] = [items.pop(self.rng.randrange(len(items)))]
+                else:
+                    self.levels[level] = []
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                self.levels[level + 1].extend(items[self.rng.randrange(2) :: 2])
+            level += 1
+
+    def quantile(self, q):
+        items = [(x, 2**level) for level, xs in enumerate(self.levels) for x in xs]
+        if len(items) == 0:
+            return float("nan")
+        items.sort()
+        cum_weights = np.cumsum([w for _, w in items])
+        return items[min(np.searchsorted(cum_weights, q * cum_weights[-1]), len(items) - 1)][0]
+
+
+class NpyAppender:
+    # 2d .npy file that rows can be appended to: the header has a fixed size and is rewritten with the new shape
+    def __init__(self, path, nb_columns):
+        self.path = path
+        self.nb_columns = nb_columns
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                f.seek(10)
+                self.nb_rows = ast.literal_eval(f.read(NPY_HEADER_SIZE - 10).decode("latin1"))["shape"][0]
+        else:
+            self.nb_rows = 0
+            with open(path, "wb") as f:
+                f.write(self._header())
+
+    def _header(self):
+        header = repr({"descr": "<f8", "fortran_order": False, "shape": (self.nb_rows, self.nb_columns)})
+        header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + "\n"
+        return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype="<f8").reshape(-1, self.nb_columns)
+        with open(self.path, "r+b") as f:
+            f.seek(NPY_HEADER_SIZE + self.nb_rows * self.nb_columns * 8)
+            f.write(rows.tobytes())
+            self.nb_rows += len(rows)
+            f.seek(0)
+            f.write(self._header())
+
+
+class ResultAggregator:
+    # constant memory summary of a stream of traveler results: failures, statistics of the total score and of each
+    # type, histogram and quantile sketch of the total score. With spill_path every result is also written as a row
+    # (total, score per type, NaN for failures) to an appendable .npy file, to open later with np.load(mmap_mode="r").
+    # seed is the seed of the quantile sketch
+    def __init__(self, bins=SCORE_BINS, spill_path=None, spill_chunk_size=SPILL_CHUNK_SIZE, seed=None):
+        self.nb_failed = 0
+        self.total = RunningStats()
+        self.per_type = [RunningStats() for _ in TYPES]
+        self.histogram = Histogram(bins)
+        self.sketch = QuantileSketch(seed=seed)
+        self.spill = None if spill_path is None else NpyAppender(spill_path, len(TYPES) + 1)
+        self.spill_chunk_size = spill_chunk_size
+        self._rows = []
+
+    @property
+    def count(self):
+        return self.total.count + self.nb_failed
+
+    def add(self, result):
+        scores = result_scores(result)
+        if scores is None:
+            self.nb_failed += 1
+            row = [np.nan] * (len(TYPES) + 1)
+        else:
+            total = float(scores.sum())
+            self.total.add(total)
+            for stats, score in zip(self.per_type, scores):
+                stats.add(float(score))
+            self.histogram.add(total)
+            self.sketch.add(total)
+            row = [total, *scores]
+
+        if self.spill is not None:
+            self._rows.append(row)
+            if len(self._rows) >= self.spill_chunk_size:
+                self.flush()
+
+    def add_all(self, results):
+        for result in results:
+            self.add(result)
+        self.flush()
+        return self
+
+    def flush(self):
+        if self.spill is not None and self._rows:
+            self.spill.append(self._rows)
+            self._rows = []
+
+    # spilled rows are not merged, each aggregator keeps its own file
+    def merge(self, other):
+        self.nb_failed += other.nb_failed
+        self.total.merge(other.total)
+        for stats, other_stats in zip(self.per_type, other.per_type):
+            stats.merge(other_stats)
+        self.histogram.merge(other.histogram)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def summary(self, quantiles=(0.1, 0.5, 0.9)):
+        return {
+            "count": self.count,
+            "failed": self.nb_failed,
+            "mean": self.total.mean,
+            "std": float(np.sqrt(self.total.variance())),
+            "quantiles": {q: self.sketch.quantile(q) for q in quantiles},
+            "mean_per_type": {artifact_type: s.mean for artifact_type, s in zip(TYPES, self.per_type)},
+        }
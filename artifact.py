@@ -1,5 +1,13 @@
+import functools
+import itertools
 import math
 import random
+from bisect import bisect
+from array import array
+from collections import Counter
+from collections.abc import MutableMapping
+
+import numpy as np
 
 TYPES = ["Flower", "Plume", "Sands", "Goblet", "Circlet"]
 
@@ -174,20 +182,36 @@ class Artifact:
         },
     }
 
-    # generate random stats when artifact is created
-    def __init__(self):
+    # score of the last get_score call and its status name, dropped by generate_subset and level_up
+    _score_key = None
+    _score = None
+    # the same for get_max_score
+    _max_score_key = None
+    _max_score = None
+
+    # generate random stats when artifact is created, rng is the random module or a random.Random.
+    # With artifact_type and main_status only the substats are generated (for drops already known to be of set 0)
+    def __init__(self, rng=random, artifact_type=None, main_status=None):
+        self.rng = rng
+        # caches first, so that every instance dict has the same keys in the same order and CPython can share them
+        self._score_key = self._score = self._max_score_key = self._max_score = None
         self.max_level = 20  # max level the artifact can be upgraded to
 
         self.level = 0
-        self.set = random.randint(0, 1)
-        self.type = TYPES[random.randint(0, len(TYPES) - 1)]
-        self.main_status = random.choices(
-            list(self.ARTIFACT_MAIN_STATS[self.type]), weights=tuple(self.ARTIFACT_MAIN_STATS[self.type].values())
-        )[0]
+        if artifact_type is None:
+            self.set = self.rng.randint(0, 1)
+            self.type = TYPES[self.rng.randint(0, len(TYPES) - 1)]
+            self.main_status = self.rng.choices(
+                list(self.ARTIFACT_MAIN_STATS[self.type]), weights=tuple(self.ARTIFACT_MAIN_STATS[self.type].values())
+            )[0]
+        else:
+            self.set = 0
+            self.type = artifact_type
+            self.main_status = main_status
 
         # generate sub stats
         self.sub_status = {}
-        for _ in range(4 if random.randint(1, 5) == 1 else 3):  # generate 4 or 3 substats
+        for _ in range(4 if self.rng.randint(1, 5) == 1 else 3):  # generate 4 or 3 substats
             self.generate_subset()
 
     # when object is printed print the artifact stats
@@ -201,11 +225,21 @@ class Artifact:
             )
         )
 
-    # function that adds 1 substat to the artifact
+    # function that adds 1 substat to the artifact, drawn directly from the substats still missing
     def generate_subset(self):
+        self._score_key = self._max_score_key = None
+        stats, cum_weights = SUB_STATS_TABLES[self.main_status, frozenset(self.sub_status)]
+        generated_stat = stats[bisect(cum_weights, self.rng.random() * cum_weights[-1])]
+        self.sub_status[generated_stat] = self.ARTIFACT_SUB_STATS_ROLL_RANGE[generated_stat][
+            self.rng.randint(0, len(self.ARTIFACT_SUB_STATS_ROLL_RANGE[generated_stat]) - 1)
+        ]
+
+    # previous sampler that redraws until the substat is not a repeated one, kept as reference for
+    # check_sub_status_sampler
+    def _generate_subset_rejection(self):
         stat_generated = False
         while not stat_generated:  # generate until substat is not a repeated one
-            generated_stat = random.choices(
+            generated_stat = self.rng.choices(
                 list(self.SUB_STATS_CHANCE["ELEM_DMG" if self.main_status[-3:] == "DMG" else self.main_status]),
                 weights=tuple(
                     self.SUB_STATS_CHANCE["ELEM_DMG" if self.main_status[-3:] == "DMG" else self.main_status].values()
@@ -215,12 +249,22 @@ class Artifact:
             if generated_stat not in self.sub_status:  # if not duplicate
 
                 self.sub_status[generated_stat] = self.ARTIFACT_SUB_STATS_ROLL_RANGE[generated_stat][
-                    random.randint(0, len(self.ARTIFACT_SUB_STATS_ROLL_RANGE[generated_stat]) - 1)
+                    self.rng.randint(0, len(self.ARTIFACT_SUB_STATS_ROLL_RANGE[generated_stat]) - 1)
                 ]
                 stat_generated = True
 
+    # independent copy of the artifact that is leveled with rng (by default the same rng)
+    def copy(self, rng=None):
+        artifact = type(self).__new__(type(self))
+        artifact.__dict__.update(self.__dict__)
+        artifact.sub_status = dict(self.sub_status)
+        if rng is not None:
+            artifact.rng = rng
+        return artifact
+
     # function to level up artifact by n levels
     def level_up(self, levels):
+        self._score_key = self._max_score_key = None
         original_level = self.level  # store current level, before level up
         self.level = min(self.level + levels, self.max_level)  # add levels to arifact but cap at max possible level
         times_to_upgrade = math.floor(self.level / 4) - math.floor(
@@ -230,12 +274,21 @@ class Artifact:
             if len(self.sub_status) == 3:  # if level up and 3 stats add one
                 self.generate_subset()
             else:  # else level up stat
-                sub_stat_to_upgrade = list(self.sub_status)[random.randint(0, 3)]
+                sub_stat_to_upgrade = list(self.sub_status)[self.rng.randint(0, 3)]
                 self.sub_status[sub_stat_to_upgrade] += self.ARTIFACT_SUB_STATS_ROLL_RANGE[sub_stat_to_upgrade][
-                    random.randint(0, len(self.ARTIFACT_SUB_STATS_ROLL_RANGE[sub_stat_to_upgrade]) - 1)
+                    self.rng.randint(0, len(self.ARTIFACT_SUB_STATS_ROLL_RANGE[sub_stat_to_upgrade]) - 1)
                 ]
 
+    # status_name is a substat name (CR x2 + CD + that substat, EM counts for 1/4) or a scoring.ScoreWeights
     def get_score(self, status_name):
+        if status_name == self._score_key:
+            return self._score
+        if not isinstance(status_name, str):
+            weights = status_name.weights
+            score = sum(weights.get(stat, 0) * value for stat, value in self.sub_status.items())
+            self._score_key, self._score = status_name, score
+            return score
+
         score = 0
         if "CR" in self.sub_status:
             score += self.sub_status["CR"] * 2
@@ -247,4 +300,578 @@ class Artifact:
                 score += self.sub_status["EM"] / 4
             else:
                 score += self.sub_status[status_name]
+        self._score_key, self._score = status_name, score
         return score
+
+    # highest get_score the artifact can reach at level 20: every upgrade left rolls the best tier of its best substat,
+    # and with 3 substats the first upgrade adds the best substat it can still get
+    def get_max_score(self, status_name):
+        if status_name == self._max_score_key:
+            return self._max_score
+        self._max_score_key, self._max_score = status_name, _max_score(self, status_name)
+        return self._max_score
+
+
+# independent (numpy RandomState, random.Random) pair from a seed or a np.random.SeedSequence, for ArtifactBatch and
+# Artifact respectively
+def make_rngs(seed):
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    np_seed_sequence, py_seed_sequence = seed_sequence.spawn(2)
+    np_rng = np.random.RandomState(np.random.MT19937(np_seed_sequence))
+    py_rng = random.Random(int.from_bytes(py_seed_sequence.generate_state(4).tobytes(), "little"))
+    return np_rng, py_rng
+
+
+def main_status_probability(artifact_type, main_status):
+    chances = Artifact.ARTIFACT_MAIN_STATS[artifact_type]
+    return chances.get(main_status, 0) / sum(chances.values())
+
+
+# integer codes used by the array based artifacts
+SUB_STATS = list(Artifact.ARTIFACT_SUB_STATS_ROLL_RANGE)
+MAIN_STATS = list(dict.fromkeys(s for artifact_type in TYPES for s in Artifact.ARTIFACT_MAIN_STATS[artifact_type]))
+BOUND_ROLLS_CACHE_SIZE = 2**14  # (weights, substats) entries, every set of substats of a few weights
+MAX_LEVEL = 20
+SCORE_WEIGHTS_CACHE_SIZE = 256
+
+SUB_STATS_ROLLS = np.array([Artifact.ARTIFACT_SUB_STATS_ROLL_RANGE[s] for s in SUB_STATS])
+SUB_STATS_ROLLS_LIST = SUB_STATS_ROLLS.tolist()
+# cumulative main status probabilities per type, and the main status codes they map to
+MAIN_STATS_CODES = [np.array([MAIN_STATS.index(s) for s in Artifact.ARTIFACT_MAIN_STATS[t]]) for t in TYPES]
+MAIN_STATS_CDF = [
+    np.cumsum(list(Artifact.ARTIFACT_MAIN_STATS[t].values())) / sum(Artifact.ARTIFACT_MAIN_STATS[t].values())
+    for t in TYPES
+]
+EMPTY_CODE = len(SUB_STATS)
+
+
+# cumulative weights of the substats that can still be drawn, for every main status and every set of substats
+# already on the artifact, keyed by stat names and by stat codes (the code sets always contain EMPTY_CODE)
+def _build_sub_status_tables():
+    tables = {}
+    code_tables = {}
+    for main_status in MAIN_STATS:
+        chances = Artifact.SUB_STATS_CHANCE["ELEM_DMG" if main_status[-3:] == "DMG" else main_status]
+        candidates = [stat for stat, weight in chances.items() if weight > 0]
+        for nb_present in range(4):
+            for present in itertools.combinations(candidates, nb_present):
+                stats = tuple(stat for stat in candidates if stat not in present)
+                cum_weights = list(itertools.accumulate(chances[stat] for stat in stats))
+                tables[main_status, frozenset(present)] = (stats, cum_weights)
+                code_tables[main_status, frozenset([SUB_STATS.index(stat) for stat in present] + [EMPTY_CODE])] = (
+                    tuple(SUB_STATS.index(stat) for stat in stats),
+                    cum_weights,
+                )
+    return tables, code_tables
+
+
+SUB_STATS_TABLES, SUB_STATS_CODE_TABLES = _build_sub_status_tables()
+# substat weights per main status code (elemental DMG goblets share the same row)
+SUB_STATS_WEIGHTS = np.array(
+    [[Artifact.SUB_STATS_CHANCE["ELEM_DMG" if m[-3:] == "DMG" else m][s] for s in SUB_STATS] for m in MAIN_STATS]
+)
+
+
+class ArtifactBatch:
+    # struct-of-arrays version of Artifact: row i of every array is one artifact.
+    # empty substat slots have code -1 and value 0
+    COLUMNS = ("type", "set", "main_status", "sub_status", "sub_values", "level")
+
+    # with artifact_type and main_status every row gets them and only the substats are generated, as in Artifact
+    def __init__(self, nb_artifacts=0, rng=np.random, artifact_type=None, main_status=None):
+        self.rng = rng
+        self._scores = {}  # status name -> scores of every row, kept up to date by level_up
+
+        self.level = np.zeros(nb_artifacts, dtype=np.int8)
+        if artifact_type is None:
+            self.set = rng.randint(0, 2, nb_artifacts).astype(np.int8)
+            self.type = rng.randint(0, len(TYPES), nb_artifacts).astype(np.int8)
+            self.main_status = np.zeros(nb_artifacts, dtype=np.int8)
+            for type_code, (codes, cdf) in enumerate(zip(MAIN_STATS_CODES, MAIN_STATS_CDF)):
+                rows = np.flatnonzero(self.type == type_code)
+                drawn = np.searchsorted(cdf, rng.random_sample(len(rows)), side="right")
+                self.main_status[rows] = codes[np.minimum(drawn, len(codes) - 1)]
+        else:
+            self.set = np.zeros(nb_artifacts, dtype=np.int8)
+            self.type = np.full(nb_artifacts, TYPES.index(artifact_type), dtype=np.int8)
+            self.main_status = np.full(nb_artifacts, MAIN_STATS.index(main_status), dtype=np.int8)
+
+        self.sub_status = np.full((nb_artifacts, 4), -1, dtype=np.int8)
+        self.sub_values = np.zeros((nb_artifacts, 4))
+        nb_sub_status = np.where(rng.random_sample(nb_artifacts) < 0.2, 4, 3)  # 4 substats with 1/5 chance
+        for slot in range(4):
+            self._add_sub_status(np.flatnonzero(nb_sub_status > slot))
+
+    @classmethod
+    def from_arrays(cls, type, set, main_status, sub_status, sub_values, level, rng=np.random):
+        batch = cls.__new__(cls)
+        batch.rng = rng
+        batch.type = np.asarray(type, dtype=np.int8)
+        batch.set = np.asarray(set, dtype=np.int8)
+        batch.main_status = np.asarray(main_status, dtype=np.int8)
+        batch.sub_status = np.asarray(sub_status, dtype=np.int8).reshape(-1, 4)
+        batch.sub_values = np.asarray(sub_values, dtype=np.float64).reshape(-1, 4)
+        batch.level = np.asarray(level, dtype=np.int8)
+        batch._scores = {}
+        return batch
+
+    @classmethod
+    def concatenate(cls, batches):
+        columns = (np.concatenate([getattr(b, name) for b in batches]) for name in cls.COLUMNS)
+        return cls.from_arrays(*columns, rng=batches[0].rng)
+
+    # batch with the columns of a list of artifacts (Artifact, CompactArtifact...), substats keep their slot order
+    @classmethod
+    def from_artifacts(cls, artifacts, rng=np.random):
+        codes = {stat: code for code, stat in enumerate(SUB_STATS)}
+        sub_status = np.full((len(artifacts), 4), -1, dtype=np.int8)
+        sub_values = np.zeros((len(artifacts), 4))
+        for row, artifact in enumerate(artifacts):
+            for slot, (stat, value) in enumerate(artifact.sub_status.items()):
+                sub_status[row, slot] = codes[stat]
+                sub_values[row, slot] = value
+        return cls.from_arrays(
+            [TYPES.index(a.type) for a in artifacts],
+            [a.set for a in artifacts],
+            [MAIN_STATS.index(a.main_status) for a in artifacts],
+            sub_status,
+            sub_values,
+            [a.level for a in artifacts],
+            rng=rng,
+        )
+
+    # the rows as a list of artifact_class (Artifact or CompactArtifact) leveled with rng
+    def to_artifacts(self, artifact_class=Artifact, rng=random):
+        artifacts = []
+        for row in range(len(self)):
+            artifact = Artifact.__new__(Artifact)
+            artifact.rng = rng
+            artifact._score_key = artifact._score = artifact._max_score_key = artifact._max_score = None
+            artifact.max_level = MAX_LEVEL
+            artifact.level = int(self.level[row])
+            artifact.set = int(self.set[row])
+            artifact.type = TYPES[self.type[row]]
+            artifact.main_status = MAIN_STATS[self.main_status[row]]
+            artifact.sub_status = {
+                SUB_STATS[code]: float(value)
+                for code, value in zip(self.sub_status[row], self.sub_values[row])
+                if code >= 0
+            }
+            artifacts.append(artifact if artifact_class is Artifact else artifact_class.from_artifact(artifact))
+        return artifacts
+
+    def __len__(self):
+        return len(self.level)
+
+    # integer index gives a row that reads and writes this batch, anything else gives a new batch
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            key = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= key < len(self):
+                raise IndexError("artifact index out of range")
+            return ArtifactRow(self, key)
+        return ArtifactBatch.from_arrays(*(getattr(self, name)[key] for name in self.COLUMNS), rng=self.rng)
+
+    def __iter__(self):
+        return (ArtifactRow(self, i) for i in range(len(self)))
+
+    # add 1 substat to each of the given rows, drawn from the weights of the substats still missing
+    def _add_sub_status(self, rows):
+        if len(rows) == 0:
+            return
+        weights = SUB_STATS_WEIGHTS[self.main_status[rows]]
+        present = self.sub_status[rows]
+        for slot in range(4):
+            has_stat = present[:, slot] >= 0
+            weights[has_stat, present[has_stat, slot]] = 0
+        cdf = np.cumsum(weights, axis=1)
+        drawn = (cdf < self.rng.random_sample(len(rows))[:, None] * cdf[:, -1:]).sum(axis=1)
+        drawn = np.minimum(drawn, len(SUB_STATS) - 1)
+
+        slot = (present >= 0).sum(axis=1)
+        self.sub_status[rows, slot] = drawn
+        self.sub_values[rows, slot] = SUB_STATS_ROLLS[drawn, self.rng.randint(0, 4, len(rows))]
+
+    # row indexes of rows: None is every row, a slice or a boolean mask the rows it selects, negative indexes count from
+    # the end. Indexes are not turned into a range of the whole batch, ArtifactRow levels one row at a time
+    def _rows(self, rows):
+        if rows is None:
+            return np.arange(len(self))
+        if isinstance(rows, slice):
+            return np.arange(len(self))[rows]
+        rows = np.atleast_1d(np.asarray(rows))
+        if rows.dtype == bool:
+            return np.flatnonzero(rows)
+        rows = rows.astype(np.int64, copy=False)
+        return np.where(rows < 0, rows + len(self), rows)
+
+    # level up the given rows (all rows by default) by n levels
+    def level_up(self, levels, rows=None):
+        rows = self._rows(rows)
+        original_level = self.level[rows].astype(np.int64)
+        new_level = np.minimum(original_level + levels, MAX_LEVEL)
+        self.level[rows] = new_level
+        times_to_upgrade = new_level // 4 - original_level // 4
+        for upgrade in range(times_to_upgrade.max(initial=0)):
+            upgraded = rows[times_to_upgrade > upgrade]
+            three_stats = self.sub_status[upgraded, 3] < 0
+            self._add_sub_status(upgraded[three_stats])
+
+            upgraded = upgraded[~three_stats]
+            slot = self.rng.randint(0, 4, len(upgraded))
+            stat = self.sub_status[upgraded, slot]
+            self.sub_values[upgraded, slot] += SUB_STATS_ROLLS[stat, self.rng.randint(0, 4, len(upgraded))]
+
+        for status_name, scores in self._scores.items():
+            scores[rows] = self._compute_scores(status_name, rows)
+
+    def _compute_scores(self, status_name, rows=slice(None)):
+        weights = score_weights(status_name)
+        return (self.sub_values[rows] * weights[self.sub_status[rows]]).sum(axis=1)
+
+    # Artifact.get_score for every row at once, cached until the rows are leveled up (do not modify the result)
+    def get_scores(self, status_name):
+        if status_name not in self._scores:
+            self._scores[status_name] = self._compute_scores(status_name)
+        return self._scores[status_name]
+
+    # Artifact.get_max_score of the given rows (all rows by default)
+    def get_max_scores(self, status_name, rows=None):
+        rows = self._rows(rows)
+        best_rolls = _best_rolls(status_name)
+        sub_status = self.sub_status[rows]
+        nb_upgrades = np.maximum(MAX_LEVEL // 4 - self.level[rows].astype(np.int64) // 4, 0)
+        best_roll = best_rolls[sub_status].max(axis=1, initial=-np.inf)
+        can_add = SUB_STATS_WEIGHTS[self.main_status[rows]] > 0
+        for slot in range(4):
+            present = np.flatnonzero(sub_status[:, slot] >= 0)
+            can_add[present, sub_status[present, slot]] = False
+        new_roll = np.where(can_add, best_rolls[:-1], -np.inf).max(axis=1, initial=-np.inf)
+        adds_stat = (sub_status[:, 3] < 0) & (nb_upgrades > 0)
+        increment = np.where(
+            adds_stat, new_roll + (nb_upgrades - 1) * np.maximum(best_roll, new_roll), nb_upgrades * best_roll
+        )
+        return self.get_scores(status_name)[rows] + increment
+
+
+# per substat code weight of Artifact.get_score, the extra last entry is for empty slots (code -1). Bounded, as every
+# scoring.ScoreWeights gets an entry
+@functools.lru_cache(maxsize=SCORE_WEIGHTS_CACHE_SIZE)
+def _score_weights(status_name):
+    return tuple(score_weights(status_name).tolist())
+
+
+# status_name can also be a scoring.ScoreWeights
+def score_weights(status_name):
+    if not isinstance(status_name, str):
+        return status_name.vector
+    weights = np.zeros(len(SUB_STATS) + 1)
+    weights[SUB_STATS.index("CR")] += 2
+    weights[SUB_STATS.index("CD")] += 1
+    if status_name in SUB_STATS:
+        weights[SUB_STATS.index(status_name)] += 0.25 if status_name == "EM" else 1
+    return weights
+
+
+# score of the best roll of each substat code, the extra last entry is -inf for empty slots (code -1). Bounded like
+# _score_weights (do not modify the result)
+@functools.lru_cache(maxsize=SCORE_WEIGHTS_CACHE_SIZE)
+def _best_rolls(status_name):
+    weights = score_weights(status_name)[:-1]
+    best = np.maximum(SUB_STATS_ROLLS[:, 0] * weights, SUB_STATS_ROLLS[:, -1] * weights)
+    return np.append(best, -np.inf)
+
+
+# (best roll of the substats, best roll of a substat that can still be added or None) of a set of substats, the
+# main status is only given for 3 substats. There is an entry per set of substats, BOUND_ROLLS_CACHE_SIZE keeps the
+# ones of a few weights
+@functools.lru_cache(maxsize=BOUND_ROLLS_CACHE_SIZE)
+def _bound_rolls(status_name, main_status, stats):
+    best_rolls = _best_rolls(status_name)
+    best_roll = float(max(best_rolls[SUB_STATS.index(stat)] for stat in stats))
+    new_roll = None
+    if main_status is not None:
+        new_stats, _ = SUB_STATS_TABLES[main_status, stats]
+        new_roll = float(max(best_rolls[SUB_STATS.index(stat)] for stat in new_stats))
+    return best_roll, new_roll
+
+
+def _max_score(artifact, status_name):
+    nb_upgrades = max(MAX_LEVEL // 4 - artifact.level // 4, 0)
+    stats = frozenset(artifact.sub_status)
+    best_roll, new_roll = _bound_rolls(status_name, artifact.main_status if len(stats) == 3 else None, stats)
+    score = artifact.get_score(status_name)
+    if nb_upgrades > 0 and new_roll is not None:
+        return score + new_roll + (nb_upgrades - 1) * max(best_roll, new_roll)
+    return score + nb_upgrades * best_roll
+
+
+class ArtifactRow(Artifact):
+    # one artifact of an ArtifactBatch, behaves like an Artifact but stores everything in the batch
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    max_level = MAX_LEVEL
+
+    @property
+    def rng(self):
+        return self.batch.rng
+
+    @property
+    def level(self):
+        return int(self.batch.level[self.index])
+
+    @property
+    def set(self):
+        return int(self.batch.set[self.index])
+
+    @property
+    def type(self):
+        return TYPES[self.batch.type[self.index]]
+
+    @property
+    def main_status(self):
+        return MAIN_STATS[self.batch.main_status[self.index]]
+
+    @property
+    def sub_status(self):
+        return {
+            SUB_STATS[code]: float(value)
+            for code, value in zip(self.batch.sub_status[self.index], self.batch.sub_values[self.index])
+            if code >= 0
+        }
+
+    def level_up(self, levels):
+        self.batch.level_up(levels, [self.index])
+
+    def get_score(self, status_name):
+        return float(self.batch.get_scores(status_name)[self.index])
+
+    def get_max_score(self, status_name):
+        return float(self.batch.get_max_scores(status_name, [self.index])[0])
+
+
+class CompactArtifact:
+    # same artifact as Artifact without an instance dict: substat codes (index in SUB_STATS) are packed in 4 bytes
+    # and values in a fixed 4 slot array, empty slots have code EMPTY_CODE and value 0.
+    # Draws random numbers in the same order as Artifact so the same seed gives the same artifact
+    __slots__ = (
+        "rng",
+        "level",
+        "set",
+        "type",
+        "main_status",
+        "codes",
+        "values",
+        "_score_key",
+        "_score",
+        "_max_score_key",
+        "_max_score",
+    )
+    max_level = MAX_LEVEL
+    EMPTY_CODE = EMPTY_CODE
+
+    def __init__(self, rng=random, artifact_type=None, main_status=None):
+        self.rng = rng
+        self.level = 0
+        if artifact_type is None:
+            self.set = self.rng.randint(0, 1)
+            self.type = TYPES[self.rng.randint(0, len(TYPES) - 1)]
+            self.main_status = self.rng.choices(
+                list(Artifact.ARTIFACT_MAIN_STATS[self.type]),
+                weights=tuple(Artifact.ARTIFACT_MAIN_STATS[self.type].values()),
+            )[0]
+        else:
+            self.set = 0
+            self.type = artifact_type
+            self.main_status = main_status
+
+        self.codes = bytes([self.EMPTY_CODE] * 4)
+        self.values = array("d", (0, 0, 0, 0))
+        self._score_key = self._max_score_key = None
+        for _ in range(4 if self.rng.randint(1, 5) == 1 else 3):  # generate 4 or 3 substats
+            self.generate_subset()
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        compact = cls.__new__(cls)
+        compact.rng = artifact.rng
+        compact.level = artifact.level
+        compact.set = artifact.set
+        compact.type = artifact.type
+        compact.main_status = artifact.main_status
+        sub_status = list(artifact.sub_status.items())
+        nb_empty = 4 - len(sub_status)
+        compact.codes = bytes([SUB_STATS.index(stat) for stat, _ in sub_status] + [cls.EMPTY_CODE] * nb_empty)
+        compact.values = array("d", [value for _, value in sub_status] + [0] * nb_empty)
+        compact._score_key = compact._max_score_key = None
+        return compact
+
+    def copy(self, rng=None):
+        compact = CompactArtifact.__new__(CompactArtifact)
+        for name in self.__slots__:
+            setattr(compact, name, getattr(self, name))
+        compact.values = array("d", self.values)
+        if rng is not None:
+            compact.rng = rng
+        return compact
+
+    def __str__(self):
+        sub_status = "".join(
+            f"-[SS{slot + 1}: ({round(self.values[slot], 1)} {SUB_STATS[code]})]"
+            for slot, code in enumerate(self.codes)
+            if code != self.EMPTY_CODE
+        )
+        return f"[level:{self.level}]-[set:{self.set}]-[type:{self.type}]-[main_status:{self.main_status}]" + sub_status
+
+    # dict like view of the substats for code written against Artifact.sub_status
+    @property
+    def sub_status(self):
+        return SubStatusView(self)
+
+    def generate_subset(self):
+        stat_codes, cum_weights = SUB_STATS_CODE_TABLES[self.main_status, frozenset(self.codes)]
+        code = stat_codes[bisect(cum_weights, self.rng.random() * cum_weights[-1])]
+        self._set_sub_status(code, SUB_STATS_ROLLS_LIST[code][self.rng.randint(0, 3)])
+
+    # put a new substat in the first empty slot
+    def _set_sub_status(self, code, value):
+        slot = self.codes.index(self.EMPTY_CODE)
+        self.codes = self.codes[:slot] + bytes([code]) + self.codes[slot + 1 :]
+        self.values[slot] = value
+        self._score_key = self._max_score_key = None
+
+    def level_up(self, levels):
+        self._score_key = self._max_score_key = None
+        original_level = self.level
+        self.level = min(self.level + levels, self.max_level)
+        for upgrade in range(self.level // 4 - original_level // 4):
+            if self.codes[3] == self.EMPTY_CODE:  # if level up and 3 stats add one
+                self.generate_subset()
+            else:
+                slot = self.rng.randint(0, 3)
+                self.values[slot] += SUB_STATS_ROLLS_LIST[self.codes[slot]][self.rng.randint(0, 3)]
+
+    def get_score(self, status_name):
+        if status_name == self._score_key:
+            return self._score
+        weights = _score_weights(status_name)
+        values = self.values
+        codes = self.codes
+        self._score_key = status_name
+        self._score = (
+            values[0] * weights[codes[0]]
+            + values[1] * weights[codes[1]]
+            + values[2] * weights[codes[2]]
+            + values[3] * weights[codes[3]]
+        )
+        return self._score
+
+    def get_max_score(self, status_name):
+        if status_name == self._max_score_key:
+            return self._max_score
+        self._max_score_key, self._max_score = status_name, _max_score(self, status_name)
+        return self._max_score
+
+
+class SubStatusView(MutableMapping):
+    # Artifact.sub_status compatible mapping backed by the slots of a CompactArtifact
+    __slots__ = ("artifact",)
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+
+    def __getitem__(self, stat):
+        if stat in SUB_STATS and SUB_STATS.index(stat) in self.artifact.codes:
+            return self.artifact.values[self.artifact.codes.index(SUB_STATS.index(stat))]
+        raise KeyError(stat)
+
+    def __setitem__(self, stat, value):
+        code = SUB_STATS.index(stat)
+        if code in self.artifact.codes:
+            self.artifact.values[self.artifact.codes.index(code)] = value
+            self.artifact._score_key = self.artifact._max_score_key = None
+        elif self.artifact.EMPTY_CODE in self.artifact.codes:
+            self.artifact._set_sub_status(code, value)
+        else:
+            raise KeyError(f"no empty substat slot for {stat}")
+
+    def __delitem__(self, stat):
+        raise TypeError("substats of an artifact can not be removed")
+
+    def __iter__(self):
+        return (SUB_STATS[code] for code in self.artifact.codes if code != self.artifact.EMPTY_CODE)
+
+    def __len__(self):
+        return sum(code != self.artifact.EMPTY_CODE for code in self.artifact.codes)
+
+
+# two sample chi-square test that both samplers draw the same substats: compares the set of 4 substats and the
+# substat drawn last (the draw the rejection sampler repeats the most), returns the p-value of each
+def check_sub_status_sampler(main_status="ATK%", nb_samples=20000):
+    samples = {}
+    for generate in [Artifact.generate_subset, Artifact._generate_subset_rejection]:
+        artifact = Artifact.__new__(Artifact)
+        artifact.rng = random
+        artifact.main_status = main_status
+        draws = []
+        for _ in range(nb_samples):
+            artifact.sub_status = {}
+            for _ in range(4):
+                generate(artifact)
+            draws.append(list(artifact.sub_status))
+        samples[generate] = draws
+
+    new, reference = samples.values()
+    return {
+        "sub_status_set": chi_square_p_value([frozenset(d) for d in new], [frozenset(d) for d in reference]),
+        "last_sub_status": chi_square_p_value([d[-1] for d in new], [d[-1] for d in reference]),
+    }
+
+
+def chi_square_p_value(sample_a, sample_b, min_count=10):
+    counts_a = Counter(sample_a)
+    counts_b = Counter(sample_b)
+    categories = [c for c in counts_a.keys() | counts_b.keys() if counts_a[c] + counts_b[c] >= min_count]
+    observed = [[counts_a[c] for c in categories], [counts_b[c] for c in categories]]
+    # rare categories are pooled together
+    observed[0].append(len(sample_a) - sum(observed[0]))
+    observed[1].append(len(sample_b) - sum(observed[1]))
+    observed = np.array(observed, dtype=float)
+    observed = observed[:, observed.sum(axis=0) > 0]
+
+    expected = observed.sum(axis=1, keepdims=True) * observed.sum(axis=0) / observed.sum()
+    statistic = ((observed - expected) ** 2 / expected).sum()
+    dof = observed.shape[1] - 1
+    if dof == 0:  # both samples take the same single value
+        return 1.0
+    # Wilson-Hilferty approximation of the chi-square distribution
+    z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+if __name__ == "__main__":
+    # memory and speed of Artifact against CompactArtifact
+    import timeit
+    import tracemalloc
+
+    nb_artifacts = 10000
+    for artifact_class in [Artifact, CompactArtifact]:
+        random.seed(0)
+        tracemalloc.start()
+        artifacts = [artifact_class() for _ in range(nb_artifacts)]
+        memory = tracemalloc.get_traced_memory()[0] / nb_artifacts
+        tracemalloc.stop()
+
+        create = timeit.timeit(artifact_class, number=nb_artifacts) / nb_artifacts
+        level_up = timeit.timeit(lambda: artifact_class().level_up(20), number=nb_artifacts) / nb_artifacts - create
+        score = timeit.timeit(lambda: [a.get_score("ATK%") for a in artifacts], number=10) / nb_artifacts / 10
+        text = timeit.timeit(lambda: [str(a) for a in artifacts[:1000]], number=1) / 1000
+        print(
+            f"{artifact_class.__name__}: {memory:.0f} bytes/artifact, create {create * 1e6:.2f} us, "
+            f"level_up(20) {level_up * 1e6:.2f} us, get_score {score * 1e6:.2f} us, str {text * 1e6:.2f} us"
+        )
+
+    for main_status in ["ATK%", "PYR_DMG", "CR"]:
+        print(f"substat sampler p-values for {main_status}: {check_sub_status_sampler(main_status)}")
@@ -0,0 +1,236 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+from artifact import TYPES, Artifact, ArtifactBatch
+from simulation import run_builds, run_traveler, simulate
+from traveler import Traveler
+
+SEED = 0
+SCALES = {"small": 1, "medium": 4, "large": 16}
+REPEAT = 3
+THRESHOLD = 0.2  # a scenario more than 20% slower than the baseline is a regression
+BASELINE_PATH = "benchmark_baseline.json"
+
+DESIRED_MAIN_STATUSES = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+DESIRED_SUB_STATUS = "ATK%"
+FREE_ARTIFACTS = {artifact_type: 0 for artifact_type in TYPES}
+BUILDS = [
+    dict(
+        desired_main_statuses=DESIRED_MAIN_STATUSES,
+        desired_sub_status=DESIRED_SUB_STATUS,
+        free_artifacts=FREE_ARTIFACTS,
+    ),
+    dict(
+        desired_main_statuses={"Flower": "HP", "Plume": "ATK", "Sands": "ER", "Goblet": "HYD_DMG", "Circlet": "CD"},
+        desired_sub_status="ER",
+        free_artifacts=FREE_ARTIFACTS,
+    ),
+    dict(
+        desired_main_statuses={"Flower": "HP", "Plume": "ATK", "Sands": "EM", "Goblet": "EM", "Circlet": "EM"},
+        desired_sub_status="EM",
+        free_artifacts=FREE_ARTIFACTS,
+    ),
+]
+
+
+# every scenario takes the scale and returns (setup, run, nb_items): setup builds the state outside of the timing,
+# run(state) is timed
+def artifact_create(scale):
+    nb_artifacts = 2000 * scale
+    return (lambda: random.Random(SEED)), (lambda rng: [Artifact(rng) for _ in range(nb_artifacts)]), nb_artifacts
+
+
+def artifact_level_up(scale):
+    nb_artifacts = 2000 * scale
+
+    def setup():
+        rng = random.Random(SEED)
+        return [Artifact(rng) for _ in range(nb_artifacts)]
+
+    def run(artifacts):
+        for artifact in artifacts:
+            artifact.level_up(20)
+
+    return setup, run, nb_artifacts
+
+
+def artifact_get_score(scale):
+    nb_artifacts = 2000 * scale
+
+    def setup():
+        artifacts = artifact_level_up(scale)[0]()
+        for artifact in artifacts:
+            artifact.level_up(20)
+        return artifacts
+
+    return setup, (lambda artifacts: [a.get_score(DESIRED_SUB_STATUS) for a in artifacts]), nb_artifacts
+
+
+def artifact_batch_create(scale):
+    nb_artifacts = 20000 * scale
+    return (lambda: np.random.RandomState(SEED)), (lambda rng: ArtifactBatch(nb_artifacts, rng)), nb_artifacts
+
+
+def _new_travelers(nb_travelers, **options):
+    return [
+        Traveler(DESIRED_MAIN_STATUSES, DESIRED_SUB_STATUS, seed=[SEED, i], **options) for i in range(nb_travelers)
+    ]
+
+
+def traveler_go_domain(weeks, **options):
+    def scenario(scale):
+        def run(travelers):
+            for traveler in travelers:
+                traveler.spend_weeks(weeks)
+
+        return (lambda: _new_travelers(scale, **options)), run, scale
+
+    return scenario
+
+
+def traveler_leveling(scale):
+    def setup():
+        travelers = _new_travelers(scale)
+        for traveler in travelers:
+            traveler.spend_weeks(8)
+        return travelers
+
+    def run(travelers):
+        for traveler in travelers:
+            traveler.levelup_4(50)
+            traveler.levelup_until_exp()
+
+    return setup, run, scale
+
+
+# a traveler that levels its artifacts every week, the bags keep every drop unless the dominated ones are pruned.
+# Pruning makes the bags smaller but not the run faster, most of the time goes to generating the drops
+def traveler_weekly(weeks, **options):
+    def scenario(scale):
+        def run(travelers):
+            for traveler in travelers:
+                for _ in range(weeks):
+                    traveler.spend_weeks(1)
+                    traveler.levelup_until_exp()
+
+        return (lambda: _new_travelers(scale, **options)), run, scale * weeks
+
+    return scenario
+
+
+def sweep(scale):
+    nb_travelers = 25 * scale
+    kwargs = dict(
+        desired_main_statuses=DESIRED_MAIN_STATUSES,
+        desired_sub_status=DESIRED_SUB_STATUS,
+        weeks=8,
+        free_artifacts=FREE_ARTIFACTS,
+    )
+
+    def run(_):
+        simulate(run_traveler, nb_travelers, seed=SEED, nb_workers=1, **kwargs)
+
+    return (lambda: None), run, nb_travelers
+
+
+# the BUILDS evaluated on the drops of each traveler, nb_items counts travelers x builds
+def sweep_builds(scale):
+    nb_travelers = 25 * scale
+
+    def run(_):
+        simulate(run_builds, nb_travelers, seed=SEED, nb_workers=1, builds=BUILDS, weeks=8)
+
+    return (lambda: None), run, nb_travelers * len(BUILDS)
+
+
+SCENARIOS = {
+    "artifact_create": artifact_create,
+    "artifact_level_up_20": artifact_level_up,
+    "artifact_get_score": artifact_get_score,
+    "artifact_batch_create": artifact_batch_create,
+    "traveler_go_domain_1w": traveler_go_domain(1),
+    "traveler_go_domain_8w": traveler_go_domain(8),
+    "traveler_go_domain_52w": traveler_go_domain(52),
+    "traveler_go_domain_lazy_52w": traveler_go_domain(52, lazy_drops=True),
+    "traveler_levelup_4_until_exp_8w": traveler_leveling,
+    "traveler_weekly_52w": traveler_weekly(52),
+    "traveler_weekly_52w_pruned": traveler_weekly(52, prune_dominated=True),
+    "sweep_8w": sweep,
+    "sweep_3_builds_8w": sweep_builds,
+}
+
+
+# best time of repeat runs of each scenario
+def run_benchmarks(scale="small", scenarios=None, repeat=REPEAT):
+    results = {}
+    for name in scenarios or SCENARIOS:
+        setup, run, nb_items = SCENARIOS[name](SCALES[scale])
+        times = []
+        for _ in range(repeat):
+            state = setup()
+            start = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - start)
+        results[name] = {"seconds": min(times), "nb_items": nb_items, "us_per_item": min(times) / nb_items * 1e6}
+    return {
+        "scale": scale,
+        "repeat": repeat,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+# scenarios of report slower than baseline by more than threshold, as {name: new time / baseline time}
+def compare(report, baseline, threshold=THRESHOLD):
+    regressions = {}
+    for name, result in report["results"].items():
+        if name not in baseline["results"] or report["scale"] != baseline["scale"]:
+            continue
+        ratio = result["seconds"] / baseline["results"][name]["seconds"]
+        if ratio > 1 + threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time artifact, traveler and sweep scenarios")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="default: all scenarios")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scale, args.scenario, args.repeat)
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = None
+
+    for name, result in report["results"].items():
+        line = f"{name:35s} {result['seconds']:9.4f} s {result['us_per_item']:12.2f} us/item"
+        if baseline is not None and name in baseline["results"] and baseline["scale"] == args.scale:
+            line += f" {result['seconds'] / baseline['results'][name]['seconds']:6.2f}x baseline"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for name, ratio in regressions.items():
+            print(f"regression: {name} is {ratio:.2f}x slower than the baseline")
+        sys.exit(1 if regressions else 0)
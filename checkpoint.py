@@ -0,0 +1,216 @@
+import json
+import os
+import pickle
+import random
+
+import numpy as np
+from artifact import TYPES, Artifact, ArtifactBatch, CompactArtifact
+from corpus import DropCorpus, DropStream
+from player import Player
+from scoring import ScoreWeights
+from traveler import Traveler
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_EVERY = 10  # chunks of a sweep between two snapshots
+ARTIFACT_CLASSES = {"Artifact": Artifact, "CompactArtifact": CompactArtifact}
+
+
+# state of a seeded Traveler or Player as arrays: bags and best set as ArtifactBatch columns (bags concatenated in
+# TYPES order), rng states as their MT19937 words and everything else as a JSON config
+def _state(traveler):
+    is_player = isinstance(traveler, Player)
+    py_rng = traveler.rng if is_player else traveler.artifact_rng
+    if not isinstance(py_rng, random.Random) or not (is_player or isinstance(traveler.rng, np.random.RandomState)):
+        raise ValueError("only travelers created with a seed can be checkpointed")
+
+    sub_status = traveler.desired_sub_status
+    config = {
+        "kind": type(traveler).__name__,
+        "desired_main_statuses": traveler.desired_main_statuses,
+        "desired_sub_status": sub_status if isinstance(sub_status, str) else {"weights": sub_status.weights},
+        "resin": int(traveler.resin),
+        "exp": int(traveler.exp),
+        "prune_dominated": traveler.prune_dominated,
+    }
+    if not is_player:
+        config.update(
+            use_batch=traveler.use_batch,
+            artifact_class=traveler.artifact_class.__name__,
+            lazy_drops=traveler.lazy_drops,
+            upgrade_table_directory=traveler.upgrade_table_directory,
+        )
+        if traveler.drops is not None:  # the corpus is not copied, only where the traveler is in it
+            config["drops"] = [traveler.drops.corpus.directory, traveler.drops.position, traveler.drops.stop]
+
+    state = {"version": np.array(CHECKPOINT_VERSION), "config": np.array(json.dumps(config))}
+    version, words, gauss_next = py_rng.getstate()
+    state["py_rng"] = np.array(words, dtype=np.uint32)
+    state["py_rng_gauss"] = np.array(np.nan if gauss_next is None else gauss_next)
+    if not is_player:
+        _, key, position, has_gauss, cached_gaussian = traveler.rng.get_state()
+        state["np_rng"] = key
+        state["np_rng_gauss"] = np.array([position, has_gauss, cached_gaussian])
+
+    bags = [traveler.bag[artifact_type] for artifact_type in TYPES]
+    state["bag_sizes"] = np.array([len(artifacts) for artifacts in bags])
+    bags = [a if isinstance(a, ArtifactBatch) else ArtifactBatch.from_artifacts(a) for a in bags]
+    best = ArtifactBatch.from_artifacts([a for a in traveler.best_set.values() if a is not None])
+    for prefix, batch in (("bag", ArtifactBatch.concatenate(bags)), ("best", best)):
+        for name in ArtifactBatch.COLUMNS:
+            state[f"{prefix}_{name}"] = getattr(batch, name)
+    return state
+
+
+def _from_state(state):
+    if int(state["version"]) != CHECKPOINT_VERSION:
+        raise ValueError(f"checkpoint version {int(state['version'])} is not supported (expected {CHECKPOINT_VERSION})")
+    config = json.loads(str(state["config"]))
+    sub_status = config["desired_sub_status"]
+    sub_status = sub_status if isinstance(sub_status, str) else ScoreWeights(sub_status["weights"])
+    py_rng = random.Random()
+    gauss_next = float(state["py_rng_gauss"])
+    py_rng.setstate((3, tuple(state["py_rng"].tolist()), None if np.isnan(gauss_next) else gauss_next))
+
+    if config["kind"] == "Player":
+        traveler = Player(
+            config["desired_main_statuses"], sub_status, prune_dominated=config.get("prune_dominated", False)
+        )
+        traveler.rng = py_rng
+        artifact_class = Artifact
+    else:
+        artifact_class = ARTIFACT_CLASSES[config["artifact_class"]]
+        traveler = Traveler(
+            config["desired_main_statuses"],
+            sub_status,
+            use_batch=config["use_batch"],
+            artifact_class=artifact_class,
+            lazy_drops=config["lazy_drops"],
+            prune_dominated=config.get("prune_dominated", False),
+            upgrade_table_directory=config.get("upgrade_table_directory"),
+        )
+        if config.get("drops") is not None:
+            directory, position, stop = config["drops"]
+            traveler.drops = DropStream(DropCorpus(directory), position, stop)
+        traveler.rng = np.random.RandomState(np.random.MT19937())
+        position, has_gauss, cached_gaussian = state["np_rng_gauss"].tolist()
+        traveler.rng.set_state(("MT19937", state["np_rng"], int(position), int(has_gauss), cached_gaussian))
+        traveler.artifact_rng = py_rng
+    traveler.resin = config["resin"]
+    traveler.exp = config["exp"]
+
+    bag = ArtifactBatch.from_arrays(*(state[f"bag_{name}"] for name in ArtifactBatch.COLUMNS), rng=traveler.rng)
+    ends = np.cumsum(state["bag_sizes"])
+    for artifact_type, start, end in zip(TYPES, ends - state["bag_sizes"], ends):
+        if getattr(traveler, "use_batch", False):
+            traveler.bag[artifact_type] = bag[start:end]
+        else:
+            traveler.bag[artifact_type] = bag[start:end].to_artifacts(artifact_class, py_rng)
+    best = ArtifactBatch.from_arrays(*(state[f"best_{name}"] for name in ArtifactBatch.COLUMNS))
+    for artifact in best.to_artifacts(artifact_class, py_rng):
+        traveler.best_set[artifact.type] = artifact
+    return traveler
+
+
+# write the state of a seeded Traveler or Player to path (.npz). The file is replaced at once, so an interrupted save
+# leaves the previous checkpoint intact
+def save_traveler(traveler, path, compress=False):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        (np.savez_compressed if compress else np.savez)(f, **_state(traveler))
+    os.replace(temp_path, path)
+
+
+# Traveler or Player saved by save_traveler, it continues exactly as the saved one would have
+def load_traveler(path):
+    with np.load(path) as state:
+        return _from_state(dict(state))
+
+
+class SweepCheckpoint:
+    # append only file of the results of a sweep: a header identifying the sweep, then one pickled list of results per
+    # snapshot. Results are small, the travelers themselves are not stored: the seeds of the travelers left give the
+    # same results after a resume. A snapshot cut by a crash is dropped when the file is opened again
+    def __init__(self, path, header, every=CHECKPOINT_EVERY):
+        self.path = path
+        self.every = every
+        self.header = dict(header, version=CHECKPOINT_VERSION)
+        self.nb_done = 0
+        self._pending = []
+        self._nb_chunks = 0
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                pickle.dump(self.header, f)
+            return
+
+        with open(path, "r+b") as f:
+            if pickle.load(f) != self.header:
+                raise ValueError(f"{path} is the checkpoint of another sweep")
+            end = f.tell()
+            for results in self._records(f):
+                self.nb_done += len(results)
+                end = f.tell()
+            f.truncate(end)
+
+    @staticmethod
+    def _records(f):
+        while True:
+            try:
+                yield pickle.load(f)
+            except (EOFError, pickle.UnpicklingError, ValueError):
+                return
+
+    # results stored by the previous runs, in traveler order
+    def iter_results(self):
+        with open(self.path, "rb") as f:
+            pickle.load(f)
+            for results in self._records(f):
+                yield from results
+
+    # results of one more chunk, written with the others of the snapshot every self.every chunks
+    def add(self, results):
+        self._pending.extend(results)
+        self._nb_chunks += 1
+        if self._nb_chunks % self.every == 0:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with open(self.path, "ab") as f:
+            pickle.dump(self._pending, f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.nb_done += len(self._pending)
+        self._pending = []
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    free_artifacts = {artifact_type: 0 for artifact_type in TYPES}
+    path = os.path.join(tempfile.mkdtemp(), "traveler.npz")
+
+    for options in [{}, {"use_batch": True}, {"artifact_class": CompactArtifact}]:
+        # interrupted after 26 weeks and resumed from the checkpoint against an uninterrupted traveler
+        results = []
+        for resume in (False, True):
+            traveler = Traveler(desired_main_statuses, "ATK%", seed=0, **options)
+            traveler.spend_weeks(26)
+            start = time.perf_counter()
+            if resume:
+                save_traveler(traveler, path)
+                saved = time.perf_counter()
+                traveler = load_traveler(path)
+                loaded = time.perf_counter()
+                print(
+                    f"{options}: save {(saved - start) * 1e3:.1f} ms, load {(loaded - saved) * 1e3:.1f} ms,"
+                    f" {os.path.getsize(path) / 1024:.0f} kB"
+                )
+            traveler.spend_weeks(26)
+            traveler.levelup_4(50)
+            traveler.levelup_until_exp()
+            results.append(traveler.get_scores(free_artifacts))
+        assert repr(results[0]) == repr(results[1]), results
+    print("resumed travelers end as the uninterrupted ones")
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from artifact import ArtifactBatch
+from traveler import PROB_DROP_TWO_ARTIFACT
+
+# ArtifactBatch columns of the drops (they all start at level 0) and the domain run of each drop
+COLUMNS = ("type", "set", "main_status", "sub_status", "sub_values", "run")
+CHUNK_SIZE = 100000  # drops generated at once
+MANIFEST = "manifest.json"
+
+
+# generate the drops of nb_runs domain runs, as Traveler.go_domain with use_batch would, and write them to directory
+# as one .npy file per column. The files are filled chunk by chunk through memory maps, so the corpus can be larger
+# than memory. A manifest of the seed and sizes is written last
+def write_corpus(directory, nb_runs, seed=None, chunk_size=CHUNK_SIZE):
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = np.random.RandomState(np.random.MT19937(seed_sequence))
+    os.makedirs(directory, exist_ok=True)
+    nb_artifacts = 1 + (rng.random_sample(nb_runs) < PROB_DROP_TWO_ARTIFACT)
+    run = np.repeat(np.arange(nb_runs), nb_artifacts)
+    np.save(os.path.join(directory, "run.npy"), run)
+
+    template = ArtifactBatch(0)
+    columns = {}
+    for name in COLUMNS[:-1]:
+        column = getattr(template, name)
+        columns[name] = np.lib.format.open_memmap(
+            os.path.join(directory, f"{name}.npy"), "w+", column.dtype, (len(run), *column.shape[1:])
+        )
+    for start in range(0, len(run), chunk_size):
+        artifacts = ArtifactBatch(min(chunk_size, len(run) - start), rng)
+        for name, column in columns.items():
+            column[start : start + len(artifacts)] = getattr(artifacts, name)
+    for column in columns.values():
+        column.flush()
+    manifest = {
+        "entropy": seed_sequence.entropy,
+        "spawn_key": seed_sequence.spawn_key,
+        "nb_runs": nb_runs,
+        "nb_drops": len(run),
+        "chunk_size": chunk_size,
+    }
+    temp_path = os.path.join(directory, f"{MANIFEST}.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, os.path.join(directory, MANIFEST))
+    return DropCorpus(directory)
+
+
+# hash of the corpus in directory that changes when it is written again with another seed or size: its manifest and
+# the shape and type of its columns. Corpora without manifest also hash the size and modification time of the files
+def corpus_fingerprint(directory):
+    parts = []
+    manifest_path = os.path.join(directory, MANIFEST)
+    has_manifest = os.path.exists(manifest_path)
+    if has_manifest:
+        with open(manifest_path) as f:
+            parts.append(f.read())
+    for name in COLUMNS:
+        path = os.path.join(directory, f"{name}.npy")
+        column = np.load(path, mmap_mode="r")
+        parts.append(f"{name} {column.shape} {column.dtype.str}")
+        if not has_manifest:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size} {stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class DropCorpus:
+    # drops written by write_corpus, read through memory maps: nothing is loaded until a slice is used
+    def __init__(self, directory):
+        self.directory = directory
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.run)
+
+    @property
+    def nb_runs(self):
+        return int(self.run[-1]) + 1 if len(self.run) else 0
+
+    # drops start to stop as an ArtifactBatch whose columns are views of the files, leveled with rng. The columns are
+    # read only: filter the batch (which copies the kept rows) before leveling it
+    def batch(self, start, stop, rng=np.random):
+        columns = [getattr(self, name)[start:stop] for name in COLUMNS[:-1]]
+        return ArtifactBatch.from_arrays(*columns, np.zeros(stop - start, dtype=np.int8), rng=rng)
+
+    # first drop of a domain run (len(self) past the last run)
+    def run_start(self, run):
+        return int(np.searchsorted(self.run, run))
+
+    # the runs of traveler index when every traveler of a sweep gets runs_per_traveler runs of its own
+    def traveler_stream(self, index, runs_per_traveler):
+        if (index + 1) * runs_per_traveler > self.nb_runs:
+            raise ValueError(f"the corpus has {self.nb_runs} runs, not enough for traveler {index}")
+        return DropStream(
+            self, self.run_start(index * runs_per_traveler), self.run_start((index + 1) * runs_per_traveler)
+        )
+
+
+class DropStream:
+    # drops start to stop of a corpus handed out in order, a domain run at a time (Traveler drops option)
+    def __init__(self, corpus, start=0, stop=None):
+        self.corpus = corpus
+        self.position = start
+        self.stop = len(corpus) if stop is None else stop
+
+    # the drops of the next nb_runs domain runs
+    def take(self, nb_runs, rng=np.random):
+        if nb_runs == 0:
+            return self.corpus.batch(self.position, self.position, rng)
+        if self.position >= self.stop:
+            raise ValueError("the drop stream is exhausted")
+        end = self.corpus.run_start(int(self.corpus.run[self.position]) + nb_runs)
+        if end > self.stop:
+            raise ValueError("the drop stream is exhausted")
+        artifacts = self.corpus.batch(self.position, end, rng)
+        self.position = end
+        return artifacts
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from artifact import TYPES
+    from traveler import Traveler
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    free_artifacts = {artifact_type: 0 for artifact_type in TYPES}
+    weeks = 8
+    runs_per_traveler = 500  # 8 weeks are 492 runs
+    nb_travelers = 200
+
+    start = time.perf_counter()
+    corpus = write_corpus(tempfile.mkdtemp(), runs_per_traveler * nb_travelers, seed=0)
+    print(f"{len(corpus)} drops written in {time.perf_counter() - start:.2f} s")
+
+    # list and batch bags, and every policy, get the same drops
+    for i in range(3):
+        bags = []
+        for use_batch in (False, True):
+            traveler = Traveler(
+                desired_main_statuses, "ATK%", use_batch, seed=i, drops=corpus.traveler_stream(i, runs_per_traveler)
+            )
+            traveler.spend_weeks(weeks)
+            bags.append([ArtifactBatch.from_artifacts(list(traveler.bag[t])).sub_values.tolist() for t in TYPES])
+        assert bags[0] == bags[1]
+
+    for drops in ("live", "corpus"):
+        start = time.perf_counter()
+        for i in range(nb_travelers):
+            stream = corpus.traveler_stream(i, runs_per_traveler) if drops == "corpus" else None
+            traveler = Traveler(desired_main_statuses, "ATK%", use_batch=True, seed=i, drops=stream)
+            traveler.spend_weeks(weeks)
+        elapsed = time.perf_counter() - start
+        print(f"{drops} drops: {elapsed / nb_travelers * 1e3:.2f} ms per traveler to farm {weeks} weeks")
@@ -0,0 +1,253 @@
+import math
+import random
+from bisect import bisect
+from itertools import accumulate
+
+import numpy as np
+from artifact import SUB_STATS, SUB_STATS_TABLES, TYPES, Artifact, main_status_probability, score_weights
+from simulation import iter_simulate
+from traveler import PROB_DROP_TWO_ARTIFACT, RESIN_PER_DOMAIN, Traveler
+
+# tilts per score point of the substat drawn when a substat is added, of the substat upgraded and of the roll tier
+THETA_STATS = 0.2
+THETA_SLOTS = 0.2
+THETA_TIERS = 0.2
+THRESHOLDS = (160, 170, 180, 190, 200)
+
+
+class Tilt:
+    # exponential tilting of the random draws of an artifact toward high scores of status_name: an option worth v score
+    # points that has probability p is drawn with probability q = p * exp(theta * v) / Z instead, the likelihood ratio
+    # of the draw is p / q = Z * exp(-theta * v). A substat is worth its weight times its mean roll, a roll tier its
+    # weight times the roll. Each table is (cumulative p, cumulative q, log p / q of each option), built once
+    def __init__(self, status_name, theta_stats=THETA_STATS, theta_slots=THETA_SLOTS, theta_tiers=THETA_TIERS):
+        self.status_name = status_name
+        self.theta_stats = theta_stats
+        self.theta_slots = theta_slots
+        self.theta_tiers = theta_tiers
+        weights = score_weights(status_name)
+        rolls = Artifact.ARTIFACT_SUB_STATS_ROLL_RANGE
+        roll_values = {stat: [weights[code] * roll for roll in rolls[stat]] for code, stat in enumerate(SUB_STATS)}
+        self.stat_values = {stat: sum(values) / len(values) for stat, values in roll_values.items()}
+        self.tiers = {stat: self._table([1] * len(values), values, theta_tiers) for stat, values in roll_values.items()}
+        self._sub_status_tables = {}
+        self._slot_tables = {}
+
+    @staticmethod
+    def _table(weights, values, theta):
+        total = sum(weights)
+        tilted = [w / total * math.exp(theta * v) for w, v in zip(weights, values)]
+        log_z = math.log(sum(tilted))
+        return list(accumulate(weights)), list(accumulate(tilted)), [log_z - theta * v for v in values]
+
+    # (substats that can be added to an artifact with main_status and the substats stats, their table)
+    def sub_status_table(self, main_status, stats):
+        key = main_status, stats
+        if key not in self._sub_status_tables:
+            candidates, cum_weights = SUB_STATS_TABLES[key]
+            weights = np.diff([0] + cum_weights).tolist()
+            values = [self.stat_values[stat] for stat in candidates]
+            self._sub_status_tables[key] = candidates, self._table(weights, values, self.theta_stats)
+        return self._sub_status_tables[key]
+
+    # table of the slot upgraded among the 4 substats stats, in slot order
+    def slot_table(self, stats):
+        if stats not in self._slot_tables:
+            values = [self.stat_values[stat] for stat in stats]
+            self._slot_tables[stats] = self._table([1] * len(stats), values, self.theta_slots)
+        return self._slot_tables[stats]
+
+
+class TiltedArtifact(Artifact):
+    # Artifact whose substat, upgraded slot and roll tier draws follow tilt when tilted is true, and the untilted
+    # distributions of Artifact otherwise. Either way log_weight sums log p / q of every draw made so far, so the
+    # likelihood ratio of the artifact is known under both. The set, type, main status and number of substats are
+    # never tilted
+    def __init__(self, rng=random, artifact_type=None, main_status=None, tilt=None, tilted=True):
+        self.tilt = tilt
+        self.tilted = tilted
+        self.log_weight = 0.0
+        super().__init__(rng, artifact_type, main_status)
+
+    def _draw(self, table):
+        cum_weights = table[1] if self.tilted else table[0]
+        index = bisect(cum_weights, self.rng.random() * cum_weights[-1])
+        self.log_weight += table[2][index]
+        return index
+
+    def _roll(self, stat):
+        return self.ARTIFACT_SUB_STATS_ROLL_RANGE[stat][self._draw(self.tilt.tiers[stat])]
+
+    def generate_subset(self):
+        self._score_key = self._max_score_key = None
+        stats, table = self.tilt.sub_status_table(self.main_status, frozenset(self.sub_status))
+        stat = stats[self._draw(table)]
+        self.sub_status[stat] = self._roll(stat)
+
+    def level_up(self, levels):
+        self._score_key = self._max_score_key = None
+        original_level = self.level
+        self.level = min(self.level + levels, self.max_level)
+        for upgrade in range(self.level // 4 - original_level // 4):
+            if len(self.sub_status) == 3:
+                self.generate_subset()
+            else:
+                stats = tuple(self.sub_status)
+                stat = stats[self._draw(self.tilt.slot_table(stats))]
+                self.sub_status[stat] += self._roll(stat)
+
+
+class TiltedDrops:
+    # artifact_class of a Traveler with lazy_drops: of the first nb_candidates[type] drops of each type, the one at a
+    # uniformly drawn index is a tilted TiltedArtifact, the others are not. The drops are then a draw of the mixture
+    # of the nb_candidates proposals "tilt drop k" (an index past the drops of the traveler tilts nothing), and
+    # log_weight is the log likelihood ratio of the traveler against that mixture. Tilting a single artifact per type
+    # keeps the weights usable however many drops the traveler gets, tilting every drop makes a few travelers carry
+    # all the weight
+    def __init__(self, tilt, nb_candidates, rng=random):
+        self.tilt = tilt
+        self.nb_candidates = nb_candidates
+        self.tilted = {artifact_type: rng.randrange(nb) for artifact_type, nb in nb_candidates.items()}
+        self.drops = {artifact_type: [] for artifact_type in TYPES}
+
+    def __call__(self, rng, artifact_type, main_status):
+        drops = self.drops[artifact_type]
+        artifact = TiltedArtifact(rng, artifact_type, main_status, self.tilt, len(drops) == self.tilted[artifact_type])
+        drops.append(artifact)
+        return artifact
+
+    # sum over the types of -log(mean over the candidates of q / p), candidates never dropped count for q / p = 1
+    def log_weight(self):
+        log_weight = 0.0
+        for artifact_type, nb in self.nb_candidates.items():
+            log_ratios = np.zeros(nb)
+            candidates = self.drops[artifact_type][:nb]
+            log_ratios[: len(candidates)] = [-artifact.log_weight for artifact in candidates]
+            top = log_ratios.max()
+            log_weight -= top + math.log(np.exp(log_ratios - top).mean())
+        return log_weight
+
+
+# expected number of drops of each type with the desired main status in weeks, the default candidates of TiltedDrops
+def expected_drops(desired_main_statuses, weeks):
+    nb_runs = (180 * 7 - 90 + 60) * weeks // RESIN_PER_DOMAIN
+    nb_drops = nb_runs * (1 + PROB_DROP_TWO_ARTIFACT)
+    return {
+        artifact_type: max(round(nb_drops * 0.5 / len(TYPES) * main_status_probability(artifact_type, main_status)), 1)
+        for artifact_type, main_status in desired_main_statuses.items()
+    }
+
+
+# run_traveler with drops from TiltedDrops, returns (result of Traveler.get_scores, log likelihood ratio of the
+# traveler). The index of the tilted drops is drawn from the artifact rng of seed before farming
+def run_tilted_traveler(
+    seed,
+    desired_main_statuses,
+    desired_sub_status,
+    weeks,
+    free_artifacts,
+    tilt,
+    nb_candidates=None,
+    percentage=50,
+    order="min_diff",
+):
+    traveler = Traveler(desired_main_statuses, desired_sub_status, seed=seed, lazy_drops=True)
+    drops = TiltedDrops(tilt, nb_candidates or expected_drops(desired_main_statuses, weeks), traveler.artifact_rng)
+    traveler.artifact_class = drops
+    traveler.spend_weeks(weeks)
+    traveler.levelup_4(percentage)
+    traveler.levelup_until_exp(order)
+    return traveler.get_scores(free_artifacts), drops.log_weight()
+
+
+# importance sampling estimates of P(total score >= threshold) from (result, log weight) pairs, failed travelers count
+# as below every threshold. Each estimate comes with its standard error and relative error, and the weights with
+# their diagnostics: the mean weight (1 in expectation, far from it means too few travelers for the tilt), the
+# effective sample size (Kish) of all travelers and of the ones above the threshold, and the share of the largest
+# weight among the latter
+def tail_estimates(samples, thresholds=THRESHOLDS):
+    totals = np.array([-np.inf if result is None else float(result[0]) for result, _ in samples])
+    weights = np.exp([log_weight for _, log_weight in samples])
+    n = len(samples)
+    report = {
+        "nb_travelers": n,
+        "mean_weight": float(weights.mean()),
+        "effective_sample_size": float(weights.sum() ** 2 / (weights**2).sum()),
+        "thresholds": {},
+    }
+    for threshold in thresholds:
+        hits = totals >= threshold
+        contributions = np.where(hits, weights, 0.0)
+        estimate = float(contributions.mean())
+        std_error = float(contributions.std(ddof=1) / math.sqrt(n)) if n > 1 else math.inf
+        hit_weights = weights[hits]
+        report["thresholds"][threshold] = {
+            "estimate": estimate,
+            "std_error": std_error,
+            "relative_error": std_error / estimate if estimate > 0 else math.inf,
+            "nb_hits": len(hit_weights),
+            "hits_effective_sample_size": (
+                float(hit_weights.sum() ** 2 / (hit_weights**2).sum()) if len(hit_weights) else 0.0
+            ),
+            "max_weight_share": float(hit_weights.max() / hit_weights.sum()) if len(hit_weights) else math.nan,
+        }
+    return report
+
+
+# tail_estimates of nb_travelers travelers of run_tilted_traveler run by simulation.iter_simulate, tilt defaults to
+# a Tilt of desired_sub_status with the default thetas
+def simulate_tail(
+    nb_travelers,
+    desired_main_statuses,
+    desired_sub_status,
+    weeks,
+    free_artifacts,
+    thresholds=THRESHOLDS,
+    tilt=None,
+    seed=None,
+    nb_workers=None,
+    **kwargs,
+):
+    samples = iter_simulate(
+        run_tilted_traveler,
+        nb_travelers,
+        seed,
+        nb_workers,
+        desired_main_statuses=desired_main_statuses,
+        desired_sub_status=desired_sub_status,
+        weeks=weeks,
+        free_artifacts=free_artifacts,
+        tilt=tilt or Tilt(desired_sub_status),
+        **kwargs,
+    )
+    return tail_estimates(list(samples), thresholds)
+
+
+if __name__ == "__main__":
+    import time
+
+    from simulation import run_traveler, simulate
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    free_artifacts = {artifact_type: 0 for artifact_type in TYPES}
+    config = dict(desired_main_statuses=desired_main_statuses, desired_sub_status="ATK%", weeks=8)
+    nb_travelers = 2000
+
+    start = time.perf_counter()
+    results = simulate(run_traveler, nb_travelers, 0, 1, **config, free_artifacts=free_artifacts, lazy_drops=True)
+    plain = tail_estimates([(result, 0.0) for result in results])
+    print(f"plain Monte Carlo, {nb_travelers} travelers in {time.perf_counter() - start:.1f} s")
+    start = time.perf_counter()
+    tilted = simulate_tail(nb_travelers, **config, free_artifacts=free_artifacts, seed=1, nb_workers=1)
+    print(
+        f"importance sampling, {nb_travelers} travelers in {time.perf_counter() - start:.1f} s: mean weight"
+        f" {tilted['mean_weight']:.3f}, effective sample size {tilted['effective_sample_size']:.0f}"
+    )
+    for threshold in THRESHOLDS:
+        p = plain["thresholds"][threshold]
+        t = tilted["thresholds"][threshold]
+        print(
+            f"P(total >= {threshold}): plain {p['estimate']:.2e} +- {p['std_error']:.1e} ({p['nb_hits']} hits),"
+            f" tilted {t['estimate']:.2e} +- {t['std_error']:.1e} ({t['nb_hits']} hits, effective"
+            f" {t['hits_effective_sample_size']:.0f}, largest weight {t['max_weight_share']:.0%})"
+        )
@@ -0,0 +1,208 @@
+import functools
+import json
+import time
+
+from artifact import TYPES, Artifact, ArtifactBatch, ArtifactRow, CompactArtifact
+from player import Player
+from traveler import Traveler
+
+
+class Recorder:
+    # wall time (inclusive of nested phases), calls and items per phase, and statistics of named counters.
+    # Recorders of several workers are merged with merge
+    def __init__(self):
+        self.phases = {}  # name -> [calls, seconds, items]
+        self.counters = {}  # name -> [count, total, max]
+
+    def add_phase(self, name, seconds, items):
+        phase = self.phases.setdefault(name, [0, 0.0, 0])
+        phase[0] += 1
+        phase[1] += seconds
+        phase[2] += items
+
+    def count(self, name, value):
+        counter = self.counters.setdefault(name, [0, 0, value])
+        counter[0] += 1
+        counter[1] += value
+        counter[2] = max(counter[2], value)
+
+    def calls(self, name):
+        return self.phases.get(name, [0])[0]
+
+    def merge(self, other):
+        for name, (calls, seconds, items) in other.phases.items():
+            phase = self.phases.setdefault(name, [0, 0.0, 0])
+            phase[0] += calls
+            phase[1] += seconds
+            phase[2] += items
+        for name, (count, total, maximum) in other.counters.items():
+            counter = self.counters.setdefault(name, [0, 0, maximum])
+            counter[0] += count
+            counter[1] += total
+            counter[2] = max(counter[2], maximum)
+        return self
+
+    def to_dict(self):
+        return {
+            "phases": {n: {"calls": c, "seconds": s, "items": i} for n, (c, s, i) in self.phases.items()},
+            "counters": {n: {"count": c, "total": t, "max": m} for n, (c, t, m) in self.counters.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        recorder = cls()
+        recorder.phases = {n: [p["calls"], p["seconds"], p["items"]] for n, p in data["phases"].items()}
+        recorder.counters = {n: [c["count"], c["total"], c["max"]] for n, c in data["counters"].items()}
+        return recorder
+
+    def report_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def report_text(self):
+        lines = [f"{'phase':40s} {'calls':>10s} {'seconds':>10s} {'us/call':>10s} {'items':>10s}"]
+        for name, (calls, seconds, items) in sorted(self.phases.items(), key=lambda x: -x[1][1]):
+            lines.append(f"{name:40s} {calls:10d} {seconds:10.4f} {seconds / calls * 1e6:10.2f} {items:10d}")
+        lines.append(f"{'counter':40s} {'count':>10s} {'mean':>10s} {'max':>10s}")
+        for name, (count, total, maximum) in sorted(self.counters.items()):
+            lines.append(f"{name:40s} {count:10d} {total / count:10.2f} {maximum:10}")
+        return "\n".join(lines)
+
+
+def _bag_size(self):
+    return sum(len(artifacts) for artifacts in self.bag.values())
+
+
+def _count_bag_sizes(recorder, self, state):
+    for artifact_type, artifacts in self.bag.items():
+        recorder.count(f"bag_size.{artifact_type}", len(artifacts))
+
+
+def _count_iterations(name):
+    def after(recorder, self, calls_before):
+        recorder.count(f"{type(self).__name__}.levelup_until_exp.iterations", recorder.calls(name) - calls_before)
+
+    return after
+
+
+# (class, method, items(self, *args), before(recorder, self), after(recorder, self, state of before))
+TARGETS = [
+    (Traveler, "spend_weeks", lambda self, weeks: weeks, None, None),
+    (Traveler, "go_domain", lambda self, nb_pull: nb_pull, None, None),
+    (Traveler, "_filter_main_status", lambda self: _bag_size(self), None, _count_bag_sizes),
+    (Traveler, "levelup_4", lambda self, percentage: _bag_size(self), None, None),
+    (
+        Traveler,
+        "levelup_until_exp",
+        None,
+        lambda recorder, self: recorder.calls("Traveler._get_max_diff_artifact"),
+        _count_iterations("Traveler._get_max_diff_artifact"),
+    ),
+    (Traveler, "_get_max_diff_artifact", None, None, None),
+    (Player, "spend_weeks", lambda self, weeks: weeks, None, None),
+    (Player, "go_domain", lambda self, nb_pull: nb_pull, None, None),
+    (Player, "_filter_main_status", lambda self: _bag_size(self), None, _count_bag_sizes),
+    (
+        Player,
+        "levelup_until_exp",
+        None,
+        lambda recorder, self: recorder.calls("Player._get_next_artifact"),
+        _count_iterations("Player._get_next_artifact"),
+    ),
+    (Player, "_get_next_artifact", None, None, None),
+    (Artifact, "get_score", None, None, None),
+    (ArtifactRow, "get_score", None, None, None),
+    (CompactArtifact, "get_score", None, None, None),
+    (ArtifactBatch, "get_scores", lambda self, status_name: len(self), None, None),
+]
+
+_originals = {}
+_recorder = None
+
+
+def _wrap(recorder, name, method, items, before, after):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        nb_items = items(self, *args, **kwargs) if items else 0
+        state = before(recorder, self) if before else None
+        start = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        recorder.add_phase(name, time.perf_counter() - start, nb_items)
+        if after:
+            after(recorder, self, state)
+        return result
+
+    return wrapper
+
+
+# wrap the TARGETS methods so they record into recorder. Until then the classes run their original methods and the
+# instrumentation costs nothing
+def enable(recorder=None):
+    global _recorder
+    disable()
+    _recorder = recorder or Recorder()
+    for cls, attr, items, before, after in TARGETS:
+        method = cls.__dict__[attr]
+        _originals[cls, attr] = method
+        setattr(cls, attr, _wrap(_recorder, f"{cls.__name__}.{attr}", method, items, before, after))
+    return _recorder
+
+
+def disable():
+    global _recorder
+    for (cls, attr), method in _originals.items():
+        setattr(cls, attr, method)
+    _originals.clear()
+    _recorder = None
+
+
+class _InstrumentedRun:
+    # simulate_one that records its own phases and returns (result, recorder as dict), usable in worker processes
+    def __init__(self, simulate_one):
+        self.simulate_one = simulate_one
+
+    def __call__(self, seed, **kwargs):
+        recorder = enable()
+        try:
+            return self.simulate_one(seed, **kwargs), recorder.to_dict()
+        finally:
+            disable()
+
+
+# simulation.simulate with every traveler instrumented, returns (results, merged Recorder)
+def profile_simulation(simulate_one, nb_travelers, seed=None, nb_workers=None, **kwargs):
+    from simulation import iter_simulate
+
+    results = []
+    recorder = Recorder()
+    for result, data in iter_simulate(_InstrumentedRun(simulate_one), nb_travelers, seed, nb_workers, **kwargs):
+        results.append(result)
+        recorder.merge(Recorder.from_dict(data))
+    return results, recorder
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from simulation import run_traveler
+
+    parser = argparse.ArgumentParser(description="where the time of a traveler sweep goes")
+    parser.add_argument("--travelers", type=int, default=50)
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    results, recorder = profile_simulation(
+        run_traveler,
+        args.travelers,
+        seed=0,
+        nb_workers=args.workers,
+        desired_main_statuses={"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"},
+        desired_sub_status="ATK%",
+        weeks=args.weeks,
+        free_artifacts={artifact_type: 0 for artifact_type in TYPES},
+    )
+    print(recorder.report_text())
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(recorder.report_json())
@@ -1,5 +1,8 @@
-from artifact import Artifact
+import random
+
+from artifact import Artifact, make_rngs
 import numpy as np
+from scoring import score_bag, upper_bounds
 
 types = ["Flower", "Plume", "Sands", "Goblet", "Circlet"]
 cost_for_level20 = 270475
@@ -11,7 +14,13 @@ exp_per_day = 101957  # https://wikiwiki.jp/genshinwiki/%E7%A8%BC%E3%81%8E#c1dff
 
 class Player:
 
-    def __init__(self, desired_main_statuses, desired_sub_status):
+    def __init__(self, desired_main_statuses, desired_sub_status, seed=None, prune_dominated=False):
+        self.rng = random if seed is None else make_rngs(seed)[1]
+        # with prune_dominated the artifacts that can not beat the best set even at level 20 are dropped from the bags,
+        # which makes them smaller but not bounded (see Traveler)
+        self.prune_dominated = prune_dominated
+        self.resin = 0
+        self.exp = 0
         self.free_artifact_scores = np.array([32, 32, 23, 15, 15])
         self.bag = {t: [] for t in types}
         self.desired_main_statuses = desired_main_statuses
@@ -26,13 +35,13 @@ class Player:
             current_best_scores = []
             for i, type in enumerate(types):
                 if self.best_set[type] is not None:
-                    current_best_scores.append(self.best_set[type].get_score(desired_sub_status))
+                    current_best_scores.append(self.best_set[type].get_score(self.desired_sub_status))
                 else:
                     current_best_scores.append(self.free_artifact_scores[i])
             current_best_scores = np.array(current_best_scores)
 
         else:  # 全箇所あるときは、一番差分がでかいところを置き換える
-            current_best_scores = np.array([a.get_score(desired_sub_status) for a in self.best_set.values()])
+            current_best_scores = np.array([a.get_score(self.desired_sub_status) for a in self.best_set.values()])
 
             diff = self.free_artifact_scores - current_best_scores
             index = np.argmax(diff)
@@ -40,13 +49,18 @@ class Player:
         return current_best_scores
 
     def spend_weeks(self, weeks):
-        resin = (180 * 7 - 90 + 60) * weeks  # 自然回復 - 週ボス + 刹那樹脂
-        nb_go_domain = resin // resin_per_domain
+        self.resin += (180 * 7 - 90 + 60) * weeks  # 自然回復 - 週ボス + 刹那樹脂
+        nb_go_domain = self.resin // resin_per_domain
+        self.resin -= nb_go_domain * resin_per_domain
         self.go_domain(nb_go_domain)
-        self.exp = exp_per_day * 7 * weeks
+        self.exp += exp_per_day * 7 * weeks
 
     def go_domain(self, nb_pull):
-        artifacts = [Artifact() for _ in range(nb_pull)]
+        artifacts = [Artifact(self.rng) for _ in range(nb_pull)]
+        if self.prune_dominated:  # the bags are already pruned against the current best set
+            artifacts = [
+                a for a in artifacts if a.main_status == self.desired_main_statuses[a.type] and self._beats_best(a)
+            ]
         for artifact in artifacts:
             self.bag[artifact.type].append(artifact)
         self._filter_main_status()
@@ -62,15 +76,21 @@ class Player:
                     temp_artifact.level_up(20)
                     self.exp -= cost_for_level20
                     self.best_set[type] = temp_artifact
+                    if self.prune_dominated:
+                        self._prune([type])
         while self.exp > 0:
             type, index = self._get_next_artifact()
+            if type is None:  # every bag is empty
+                break
             next_artifact = self.bag[type].pop(index)
             next_artifact.level_up(20)
             self.exp -= cost_for_level20
 
-            next_score = next_artifact.get_score(desired_sub_status)
-            if self.best_set[type].get_score(desired_sub_status) < next_score:
+            next_score = next_artifact.get_score(self.desired_sub_status)
+            if self.best_set[type].get_score(self.desired_sub_status) < next_score:
                 self.best_set[type] = next_artifact
+                if self.prune_dominated:
+                    self._prune([type])
 
     def _filter_main_status(self):
         for type, artifact_per_type in self.bag.items():
@@ -80,9 +100,26 @@ class Player:
                     filtered.append(a)
             self.bag[type] = filtered
 
+    def _beats_best(self, artifact):
+        best = self.best_set[artifact.type]
+        if best is None:
+            return True
+        return artifact.get_max_score(self.desired_sub_status) >= best.get_score(self.desired_sub_status)
+
+    # drop the artifacts whose Artifact.get_max_score is below the score of the best set piece of their type, as
+    # Traveler does: ties are kept
+    def _prune(self, artifact_types):
+        for type in artifact_types:
+            artifact_per_type = self.bag[type]
+            if self.best_set[type] is None or len(artifact_per_type) == 0:
+                continue
+            keep = upper_bounds(artifact_per_type, self.desired_sub_status) >= self.best_set[type].get_score(
+                self.desired_sub_status
+            )
+            self.bag[type] = [a for a, kept in zip(artifact_per_type, keep) if kept]
+
     def _get_best_artifact_index(self, type):
-        artifact_list = self.bag[type]
-        scores = [a.get_score(self.desired_sub_status) for a in artifact_list]
+        scores = score_bag(self.bag[type], self.desired_sub_status)
         if len(scores) == 0:
             return None
         else:
@@ -95,10 +132,12 @@ class Player:
         for type, artifact_per_type in self.bag.items():
             if len(artifact_per_type) == 0:
                 continue
-            scores = np.array([a.get_score(self.desired_sub_status) for a in artifact_per_type])
+            scores = score_bag(artifact_per_type, self.desired_sub_status)
             diff = -scores + self.best_set[type].get_score(self.desired_sub_status)
             score_diff[type] = np.max(diff)  # 次点とのスコアの差
             score_diff_index[type] = np.argmax(diff)
+        if len(score_diff) == 0:
+            return None, None
         next_artifact_type = max(score_diff)
         next_artifact_index = score_diff_index[next_artifact_type]
 
@@ -106,33 +145,44 @@ class Player:
 
 
 if __name__ == "__main__":
+    import os
+
     import pylab as plt
     import seaborn as sns
+    from aggregate import ResultAggregator
+    from simulation import iter_simulate, run_player_horizons
 
     desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
     desired_sub_status = "ATK%"
     nb_travelers = 1000
-    for j in range(3, 6):
-        all_scores = []
-        nb_failed = 0
-        for i in range(nb_travelers):
-            player = Player(desired_main_statuses, desired_sub_status)
-            player.spend_weeks(j)
-            player.levelup_until_exp()
-            scores = player.get_max_scores()
-            if len(scores) == 0:
-                nb_failed += 1
-            else:
-                all_scores.append(scores)
-        all_scores = np.array(all_scores)
-        # hist, bins = np.histogram(all_scores.sum(axis=1))
-        # print(np.cumsum(hist).shape, bins.shape)
-
-        # plt.plot(bins[:-1], np.cumsum(hist))
-        all_scores = np.sort(all_scores.sum(axis=1))
-        all_scores = [np.nan] * nb_failed + list(all_scores)
+    seed = 0
+    horizons = range(3, 6)
+    # every player farms once up to the last horizon and is scored at each of them. Results are spilled to
+    # scores_{j}weeks.npy as they come, the curves are plotted from the memory maps
+    aggregators = {}
+    for j in horizons:
+        spill_path = f"scores_{j}weeks.npy"
+        if os.path.exists(spill_path):
+            os.remove(spill_path)
+        aggregators[j] = ResultAggregator(spill_path=spill_path, seed=seed)
+    results = iter_simulate(
+        run_player_horizons,
+        nb_travelers,
+        seed=seed,
+        desired_main_statuses=desired_main_statuses,
+        desired_sub_status=desired_sub_status,
+        horizons=horizons,
+    )
+    for result in results:
+        for j, scores in result.items():
+            aggregators[j].add(scores)
+
+    for j, aggregator in aggregators.items():
+        aggregator.flush()
+        all_scores = np.sort(np.load(aggregator.spill.path, mmap_mode="r")[:, 0])
+        all_scores = np.roll(all_scores, aggregator.nb_failed)  # failures are NaN, sorted last but plotted first
         plt.plot(all_scores, label=f"{j} weeks")
-        print(j, nb_failed)
+        print(j, aggregator.nb_failed, aggregator.summary())
 
     plt.xlabel("# Travelers")
     plt.ylabel("Score")
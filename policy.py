@@ -0,0 +1,171 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+from aggregate import result_scores
+from simulation import iter_simulate
+from traveler import LEVELING_ORDERS, Traveler
+
+PERCENTAGES = (0, 25, 50, 75, 100)
+POLICIES = [(percentage, order) for order in LEVELING_ORDERS for percentage in PERCENTAGES]
+INITIAL_TRAVELERS = 40
+ETA = 2  # each round keeps 1 / ETA of the policies and runs ETA times more travelers
+CONFIDENCE = 0.95
+
+
+def _copy_seed(seed):
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+
+
+# total score of every policy (levelup_4 percentage, levelup_until_exp order) on the same traveler: the drops are
+# farmed once and every policy levels a copy of them with the same leveling seed (common random numbers), so the
+# differences between policies are not hidden by the luck of the drops. None for every policy when the traveler
+# failed, which only depends on the drops
+def evaluate_policies(seed, policies, desired_main_statuses, desired_sub_status, weeks, free_artifacts, **options):
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    pool = Traveler(desired_main_statuses, desired_sub_status, seed=seed, **options)
+    pool.spend_weeks(weeks)
+    leveling_seed = seed.spawn(1)[0]
+    totals = []
+    for percentage, order in policies:
+        traveler = Traveler.from_pool(pool, desired_main_statuses, desired_sub_status, _copy_seed(leveling_seed))
+        traveler.levelup_4(percentage)
+        traveler.levelup_until_exp(order)
+        scores = result_scores(traveler.get_scores(free_artifacts))
+        totals.append(None if scores is None else float(scores.sum()))
+    return totals
+
+
+def _mean_interval(values, z):
+    if len(values) < 2:
+        return float(np.mean(values)) if len(values) else float("nan"), -math.inf, math.inf
+    mean = float(np.mean(values))
+    half_width = z * float(np.std(values, ddof=1)) / math.sqrt(len(values))
+    return mean, mean - half_width, mean + half_width
+
+
+# best policy of one build after some weeks by successive halving: every round runs the remaining policies on new
+# travelers (the same for all of them), then keeps the 1 / eta with the best mean total score, until one is left.
+# Returns the best policy with a confidence interval of its mean, and for every other policy the interval of its
+# difference with the best one on the travelers both were run on
+def successive_halving(
+    desired_main_statuses,
+    desired_sub_status,
+    weeks,
+    free_artifacts,
+    policies=POLICIES,
+    seed=None,
+    nb_workers=None,
+    initial_travelers=INITIAL_TRAVELERS,
+    eta=ETA,
+    confidence=CONFIDENCE,
+    **options,
+):
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    survivors = list(policies)
+    totals = {policy: [] for policy in survivors}  # total of each traveler that did not fail, in traveler order
+    nb_travelers = 0
+    nb_failed = 0
+    nb_evaluations = 0
+    batch = initial_travelers
+    while True:
+        results = iter_simulate(
+            evaluate_policies,
+            batch,
+            root,
+            nb_workers,
+            first_traveler=nb_travelers,
+            policies=survivors,
+            desired_main_statuses=desired_main_statuses,
+            desired_sub_status=desired_sub_status,
+            weeks=weeks,
+            free_artifacts=free_artifacts,
+            **options,
+        )
+        for result in results:
+            if result[0] is None:
+                nb_failed += 1
+                continue
+            for policy, total in zip(survivors, result):
+                totals[policy].append(total)
+        nb_travelers += batch
+        nb_evaluations += batch * len(survivors)
+        if len(survivors) == 1:
+            break
+        survivors.sort(key=lambda policy: -np.mean(totals[policy]) if totals[policy] else math.inf)
+        survivors = survivors[: math.ceil(len(survivors) / eta)]
+        if len(survivors) == 1:
+            break
+        batch *= eta
+
+    best = survivors[0]
+    mean, low, high = _mean_interval(totals[best], z)
+    ranking = []
+    for policy in sorted(policies, key=lambda p: (-len(totals[p]), -np.mean(totals[p]) if totals[p] else math.inf)):
+        if policy == best:
+            continue
+        n = len(totals[policy])
+        difference, difference_low, difference_high = _mean_interval(
+            np.subtract(totals[best][:n], totals[policy]), z
+        )
+        ranking.append(
+            {
+                "policy": policy,
+                "nb_travelers": n,
+                "difference": difference,
+                "difference_low": difference_low,
+                "difference_high": difference_high,
+            }
+        )
+    return {
+        "best": best,
+        "mean": mean,
+        "low": low,
+        "high": high,
+        "confidence": confidence,
+        "nb_travelers": nb_travelers,
+        "nb_failed": nb_failed,
+        "nb_evaluations": nb_evaluations,
+        "naive_evaluations": nb_travelers * len(policies),  # every policy on as many travelers as the best one
+        "others": ranking,
+    }
+
+
+# successive_halving for every build (dict of desired_main_statuses, desired_sub_status and free_artifacts) and
+# number of weeks, returns {(index of the build, weeks): report}. Each pair gets its own child of SeedSequence(seed)
+def optimize_policies(builds, weeks_list, policies=POLICIES, seed=None, **options):
+    pairs = [(i, weeks) for i in range(len(builds)) for weeks in weeks_list]
+    seeds = np.random.SeedSequence(seed).spawn(len(pairs))
+    return {
+        (i, weeks): successive_halving(**builds[i], weeks=weeks, policies=policies, seed=s, **options)
+        for (i, weeks), s in zip(pairs, seeds)
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    from artifact import TYPES
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    builds = [
+        dict(
+            desired_main_statuses=desired_main_statuses,
+            desired_sub_status="ATK%",
+            free_artifacts={artifact_type: 0 for artifact_type in TYPES},
+        )
+    ]
+    start = time.perf_counter()
+    for (build, weeks), report in optimize_policies(builds, [4, 8], seed=0, nb_workers=1).items():
+        print(
+            f"build {build}, {weeks} weeks: best {report['best']} mean {report['mean']:.2f} in "
+            f"[{report['low']:.2f}, {report['high']:.2f}], {report['nb_evaluations']} evaluations "
+            f"({report['naive_evaluations']} for the same travelers on the full grid)"
+        )
+        for other in report["others"][:4]:
+            print(
+                f"  {other['policy']}: {other['difference']:.2f} behind in "
+                f"[{other['difference_low']:.2f}, {other['difference_high']:.2f}] on {other['nb_travelers']} travelers"
+            )
+    print(f"{time.perf_counter() - start:.1f} s")
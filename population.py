@@ -0,0 +1,243 @@
+import math
+
+import numpy as np
+from artifact import TYPES, ArtifactBatch, main_status_probability, make_rngs
+from traveler import COST_LEVEL_4, COST_LEVEL_20, EXP_PER_DAY, PROB_DROP_TWO_ARTIFACT, RESIN_PER_DOMAIN
+
+NO_CANDIDATE = 1000  # key of a type without artifact to level, as in Traveler._get_max_diff_artifact
+
+
+def _padded_index(owner, nb_travelers):
+    # (traveler, position in its bag) -> row of the batch, -1 past the end of the bag. Rows keep their order
+    order = np.argsort(owner, kind="stable")
+    counts = np.bincount(owner, minlength=nb_travelers)
+    column = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    index = np.full((nb_travelers, counts.max(initial=0)), -1, dtype=np.int64)
+    index[owner[order], column] = order
+    return index
+
+
+class Population:
+    # nb_travelers Travelers of the same build advanced together: the traveler is an array axis. The artifacts of each
+    # type are one ArtifactBatch for the whole population and each traveler's bag is a row of a padded matrix of batch
+    # rows (-1 past its end). Drops are generated lazily (only the ones Traveler keeps), and levelup_4,
+    # levelup_until_exp and get_scores make the decisions of Traveler with list bags for every traveler at once
+    def __init__(self, nb_travelers, desired_main_statuses, desired_sub_status, seed=None):
+        self.nb_travelers = nb_travelers
+        self.desired_main_statuses = desired_main_statuses
+        self.desired_sub_status = desired_sub_status
+        self.rng = np.random if seed is None else make_rngs(seed)[0]
+        self.resin = 0
+        self.exp = np.zeros(nb_travelers, dtype=np.int64)
+        self.bag = {artifact_type: ArtifactBatch(rng=self.rng) for artifact_type in TYPES}
+        self.owner = {artifact_type: np.zeros(0, dtype=np.int64) for artifact_type in TYPES}
+        self.index = {artifact_type: np.zeros((nb_travelers, 0), dtype=np.int64) for artifact_type in TYPES}
+
+    def spend_weeks(self, weeks):
+        self.resin += (180 * 7 - 90 + 60) * weeks
+        nb_go_domain = self.resin // RESIN_PER_DOMAIN
+        self.resin -= nb_go_domain * RESIN_PER_DOMAIN
+        self.go_domain(nb_go_domain)
+        self.exp += EXP_PER_DAY * 7 * weeks
+
+    # the number of drops kept per type is multinomial for each traveler, drawn as one binomial per type
+    def go_domain(self, nb_pull):
+        remaining = nb_pull + self.rng.binomial(nb_pull, PROB_DROP_TWO_ARTIFACT, self.nb_travelers)
+        rest = 1.0
+        for artifact_type in TYPES:
+            main_status = self.desired_main_statuses[artifact_type]
+            probability = 0.5 / len(TYPES) * main_status_probability(artifact_type, main_status)
+            counts = self.rng.binomial(remaining, min(probability / rest, 1.0))
+            remaining -= counts
+            rest -= probability
+
+            artifacts = ArtifactBatch(counts.sum(), self.rng, artifact_type, main_status)
+            self.bag[artifact_type] = ArtifactBatch.concatenate([self.bag[artifact_type], artifacts])
+            self.owner[artifact_type] = np.concatenate(
+                [self.owner[artifact_type], np.repeat(np.arange(self.nb_travelers), counts)]
+            )
+            self.index[artifact_type] = _padded_index(self.owner[artifact_type], self.nb_travelers)
+
+    # (scores, levels) of the padded bags of a type, -inf and MAX_LEVEL past the end of the bags
+    def _padded(self, artifact_type):
+        index = self.index[artifact_type]
+        batch = self.bag[artifact_type]
+        valid = index >= 0
+        scores = np.where(valid, batch.get_scores(self.desired_sub_status)[index], -np.inf)
+        levels = np.where(valid, batch.level[index], 20)
+        return scores, levels
+
+    # Traveler.levelup_4: the best percentage of each bag (all of it below 3 artifacts) gains 4 levels, and the bags
+    # are reordered from best to worst as the list bags of Traveler
+    def levelup_4(self, percentage):
+        for artifact_type in TYPES:
+            index = self.index[artifact_type]
+            scores, _ = self._padded(artifact_type)
+            order = np.argsort(-scores, axis=1, kind="stable")
+            self.index[artifact_type] = index = np.take_along_axis(index, order, axis=1)
+
+            counts = (index >= 0).sum(axis=1)
+            nb_levelup = np.where(counts < 3, counts, np.ceil(counts * percentage / 100).astype(np.int64))
+            selected = np.arange(index.shape[1]) < nb_levelup[:, None]
+            self.bag[artifact_type].level_up(4, index[selected])
+            self.exp -= COST_LEVEL_4 * nb_levelup
+
+    # per type, for every traveler: position of the best artifact (-1 for an empty bag), position of the best unmaxed
+    # artifact other than it (-1 if none), and the padded scores and levels. Ties go to the first position
+    def _best_and_runner_up(self, artifact_type):
+        scores, levels = self._padded(artifact_type)
+        rows = np.arange(self.nb_travelers)
+        if scores.shape[1] == 0:
+            empty = np.full(self.nb_travelers, -1)
+            return empty, empty, scores, levels
+        best = np.argmax(scores, axis=1)
+        has_best = scores[rows, best] > -np.inf
+        unmaxed = np.where(levels < 20, scores, -np.inf)
+        unmaxed[rows, best] = -np.inf
+        runner_up = np.argmax(unmaxed, axis=1)
+        has_runner_up = unmaxed[rows, runner_up] > -np.inf
+        return np.where(has_best, best, -1), np.where(has_runner_up, runner_up, -1), scores, levels
+
+    def _level_up(self, artifact_type, travelers, positions, levels):
+        self.bag[artifact_type].level_up(levels, self.index[artifact_type][travelers, positions])
+
+    # Traveler.levelup_until_exp, one greedy step of every traveler that still has exp per iteration.
+    # order is "min_diff" or "max_score" (see traveler.LEVELING_ORDERS)
+    def levelup_until_exp(self, order="min_diff"):
+        if order not in ("min_diff", "max_score"):
+            raise ValueError(f"leveling order {order} is not supported by Population")
+        rows = np.arange(self.nb_travelers)
+        for artifact_type in TYPES:
+            best, _, _, levels = self._best_and_runner_up(artifact_type)
+            level = np.where(best >= 0, levels[rows, np.maximum(best, 0)], 20)
+            self.exp -= np.where(level == 4, COST_LEVEL_20 - COST_LEVEL_4, np.where(level == 0, COST_LEVEL_20, 0))
+            to_level = (level == 0) | (level == 4)
+            self._level_up(artifact_type, rows[to_level], best[to_level], 20)
+
+        active = np.ones(self.nb_travelers, dtype=bool)
+        while active.any():
+            keys = np.full((self.nb_travelers, len(TYPES)), NO_CANDIDATE, dtype=float)
+            candidates = []
+            for type_code, artifact_type in enumerate(TYPES):
+                best, runner_up, scores, levels = self._best_and_runner_up(artifact_type)
+                has_candidate = runner_up >= 0
+                runner_up_score = np.where(has_candidate, scores[rows, np.maximum(runner_up, 0)], 0)
+                if order == "min_diff":
+                    key = scores[rows, np.maximum(best, 0)] - runner_up_score
+                else:
+                    key = -runner_up_score
+                keys[:, type_code] = np.where(has_candidate, key, NO_CANDIDATE)
+                candidates.append((runner_up, levels[rows, np.maximum(runner_up, 0)], has_candidate))
+
+            chosen = np.argmin(keys, axis=1)
+            runner_up = np.choose(chosen, [c[0] for c in candidates])
+            level = np.choose(chosen, [c[1] for c in candidates])
+            has_candidate = np.choose(chosen, [c[2] for c in candidates])
+            cost = np.where(level == 4, COST_LEVEL_20 - COST_LEVEL_4, np.where(level == 0, COST_LEVEL_20, 0))
+            active &= has_candidate & (cost > 0)  # nothing left to level
+            active &= self.exp >= cost  # the upgrade is not done nor paid for, exp carries over
+            self.exp[active] -= cost[active]
+            for type_code, artifact_type in enumerate(TYPES):
+                travelers = rows[active & (chosen == type_code)]
+                self._level_up(artifact_type, travelers, runner_up[travelers], 20)
+
+    # Traveler.get_scores of every traveler: (total, score per type in TYPES order), NaN for failed travelers
+    def get_scores(self, free_artifacts):
+        rows = np.arange(self.nb_travelers)
+        scores = np.full((self.nb_travelers, len(TYPES)), -1.0)
+        for type_code, artifact_type in enumerate(TYPES):
+            best, _, padded_scores, _ = self._best_and_runner_up(artifact_type)
+            scores[:, type_code] = np.where(best >= 0, padded_scores[rows, np.maximum(best, 0)], -1)
+
+        free = np.array([free_artifacts[artifact_type] for artifact_type in TYPES], dtype=float)
+        missing = scores < 0
+        nb_missing = missing.sum(axis=1)
+        scores = np.where(missing & (nb_missing == 1)[:, None], free, scores)
+        diff = free - scores
+        free_type = np.argmax(diff, axis=1)
+        replace = (nb_missing == 0) & (diff[rows, free_type] >= 0)
+        scores[rows[replace], free_type[replace]] = free[free_type[replace]]
+        scores[nb_missing > 1] = np.nan
+        return scores.sum(axis=1), scores
+
+
+# p-value of the two sample Kolmogorov-Smirnov test (asymptotic distribution)
+def ks_p_value(sample_a, sample_b):
+    sample_a = np.sort(sample_a)
+    sample_b = np.sort(sample_b)
+    values = np.concatenate([sample_a, sample_b])
+    cdf_a = np.searchsorted(sample_a, values, side="right") / len(sample_a)
+    cdf_b = np.searchsorted(sample_b, values, side="right") / len(sample_b)
+    n = len(sample_a) * len(sample_b) / (len(sample_a) + len(sample_b))
+    statistic = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * np.abs(cdf_a - cdf_b).max()
+    return min(1.0, 2 * sum((-1) ** (k - 1) * math.exp(-2 * k**2 * statistic**2) for k in range(1, 101)))
+
+
+# Population against the same number of object travelers (simulation.run_traveler): p-values of the total score
+# distribution (Kolmogorov-Smirnov), of each type's score distribution and of the failure rate (chi-square)
+def compare_with_traveler(
+    nb_travelers, desired_main_statuses, desired_sub_status, weeks, free_artifacts, percentage=50, seed=None
+):
+    from artifact import chi_square_p_value
+    from simulation import run_traveler, simulate
+
+    population_seed, traveler_seed = np.random.SeedSequence(seed).spawn(2)
+    population = Population(nb_travelers, desired_main_statuses, desired_sub_status, population_seed)
+    population.spend_weeks(weeks)
+    population.levelup_4(percentage)
+    population.levelup_until_exp()
+    totals, scores = population.get_scores(free_artifacts)
+
+    results = simulate(
+        run_traveler,
+        nb_travelers,
+        traveler_seed,
+        desired_main_statuses=desired_main_statuses,
+        desired_sub_status=desired_sub_status,
+        weeks=weeks,
+        free_artifacts=free_artifacts,
+        percentage=percentage,
+        lazy_drops=True,
+    )
+    reference = np.array(
+        [[np.nan] * len(TYPES) if r is None else [r[1][artifact_type] for artifact_type in TYPES] for r in results]
+    )
+    ok = ~np.isnan(totals)
+    reference_ok = ~np.isnan(reference[:, 0])
+    p_values = {"total": ks_p_value(totals[ok], reference.sum(axis=1)[reference_ok])}
+    for type_code, artifact_type in enumerate(TYPES):
+        p_values[artifact_type] = ks_p_value(scores[ok, type_code], reference[reference_ok, type_code])
+    p_values["failure_rate"] = chi_square_p_value(list(ok), list(reference_ok), min_count=0)
+    return {
+        "p_values": p_values,
+        "mean": float(totals[ok].mean()),
+        "reference_mean": float(reference.sum(axis=1)[reference_ok].mean()),
+        "failure_rate": float(1 - ok.mean()),
+        "reference_failure_rate": float(1 - reference_ok.mean()),
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    free_artifacts = {artifact_type: 0 for artifact_type in TYPES}
+
+    # without failures in either sample the failure rate test has no degree of freedom and passes
+    comparison = compare_with_traveler(300, desired_main_statuses, "ATK%", 16, free_artifacts, seed=0)
+    assert comparison["failure_rate"] == comparison["reference_failure_rate"] == 0
+    assert comparison["p_values"]["failure_rate"] == 1.0
+
+    for weeks in (2, 8):
+        comparison = compare_with_traveler(2000, desired_main_statuses, "ATK%", weeks, free_artifacts, seed=weeks)
+        print(f"{weeks} weeks: population against Traveler {comparison}")
+
+    for nb_travelers in (1000, 10000):
+        start = time.perf_counter()
+        population = Population(nb_travelers, desired_main_statuses, "ATK%", seed=0)
+        population.spend_weeks(8)
+        population.levelup_4(50)
+        population.levelup_until_exp()
+        population.get_scores(free_artifacts)
+        elapsed = time.perf_counter() - start
+        print(f"{nb_travelers} travelers, 8 weeks: {elapsed:.2f} s, {elapsed / nb_travelers * 1e6:.0f} us/traveler")
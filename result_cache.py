@@ -0,0 +1,253 @@
+import ast
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+from aggregate import result_scores
+from artifact import TYPES
+from corpus import corpus_fingerprint
+from simulation import iter_simulate
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "genshin-artifact-simulator")
+MEMORY_ENTRIES = 32
+DISK_SIZE_CAP = 256 * 2**20  # bytes
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_CODE_HASHES = {}
+_CODE_VERSIONS = {}  # module of simulate_one -> code_version
+
+
+def _module_hash(name):
+    if name not in _CODE_HASHES:
+        with open(importlib.util.find_spec(name).origin, "rb") as f:
+            _CODE_HASHES[name] = hashlib.sha256(f.read()).hexdigest()
+    return _CODE_HASHES[name]
+
+
+# modules of the simulator (the .py files next to this one) that module imports, directly or through other modules
+# of the simulator. Imports inside functions and __main__ blocks count too
+def imported_modules(name, found=None):
+    found = set() if found is None else found
+    spec = importlib.util.find_spec(name) if name not in found else None
+    if spec is None or not spec.has_location or os.path.dirname(os.path.abspath(spec.origin)) != SOURCE_DIR:
+        return found
+    found.add(name)
+    with open(spec.origin, "rb") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imported_modules(alias.name, found)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            imported_modules(node.module, found)
+    return found
+
+
+# (module, name) of what simulate_one calls: the function of a functools.partial, the class of a callable instance
+def _names(simulate_one):
+    while isinstance(simulate_one, functools.partial):
+        simulate_one = simulate_one.func
+    if not hasattr(simulate_one, "__qualname__"):
+        simulate_one = type(simulate_one)
+    return simulate_one.__module__, simulate_one.__qualname__
+
+
+# hash of the source of the modules simulate_one runs (its module, simulation and everything they import from the
+# simulator), any edit to them gives new cache keys
+def code_version(simulate_one):
+    module, _ = _names(simulate_one)
+    if module not in _CODE_VERSIONS:
+        modules = imported_modules("simulation")
+        if module != "__main__":
+            imported_modules(module, modules)
+        hashes = " ".join(_module_hash(name) for name in sorted(modules))
+        _CODE_VERSIONS[module] = hashlib.sha256(hashes.encode()).hexdigest()
+    return _CODE_VERSIONS[module]
+
+
+# JSON value of a keyword argument of simulate_one, the same for equal arguments in every process
+def _canonical(value):
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {str(key): _canonical(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple, range)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, type):  # artifact_class
+        return f"{value.__module__}.{value.__qualname__}"
+    if hasattr(value, "weights"):  # ScoreWeights
+        return {"weights": _canonical(value.weights)}
+    raise TypeError(f"{value!r} can not be part of a cache key")
+
+
+# stable key of the travelers of a sweep: simulate_one, its arguments, the seed and the code version. The number of
+# travelers is not part of it, traveler i of a key is always the same
+def config_key(simulate_one, seed, kwargs):
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    config = {
+        "simulate_one": ".".join(_names(simulate_one)),
+        "entropy": root.entropy,
+        "spawn_key": root.spawn_key,
+        "kwargs": _canonical(kwargs),
+        "code": code_version(simulate_one),
+    }
+    keywords = dict(simulate_one.keywords, **kwargs) if isinstance(simulate_one, functools.partial) else kwargs
+    if "corpus_directory" in keywords:  # run_corpus_traveler, the drops are read from there
+        config["corpus"] = corpus_fingerprint(keywords["corpus_directory"])
+    if isinstance(simulate_one, functools.partial):
+        config["partial"] = _canonical([list(simulate_one.args), simulate_one.keywords])
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+# rows (total, score per type in TYPES order) of Traveler.get_scores or Player.get_max_scores results, NaN for failures
+def result_rows(results):
+    rows = np.full((len(results), len(TYPES) + 1), np.nan)
+    for row, result in zip(rows, results):
+        scores = result_scores(result)
+        if scores is not None:
+            row[0] = scores.sum()
+            row[1:] = scores
+    return rows
+
+
+# ResultAggregator.summary of result rows, with exact quantiles
+def summarize(rows, quantiles=(0.1, 0.5, 0.9)):
+    ok = rows[~np.isnan(rows[:, 0])]
+    return {
+        "count": len(rows),
+        "failed": len(rows) - len(ok),
+        "mean": float(ok[:, 0].mean()) if len(ok) else 0.0,
+        "std": float(ok[:, 0].std(ddof=1)) if len(ok) > 1 else float("nan"),
+        "quantiles": {q: float(np.quantile(ok[:, 0], q)) if len(ok) else float("nan") for q in quantiles},
+        "mean_per_type": {t: float(ok[:, i].mean()) if len(ok) else 0.0 for i, t in enumerate(TYPES, 1)},
+    }
+
+
+class ResultCache:
+    # result rows of seeded sweeps by config_key: the last max_entries used in memory, and every sweep as a .npy file
+    # in directory, the least recently used files are deleted when they take more than max_bytes. A sweep of more
+    # travelers than cached only runs the missing ones, they are the next travelers of the same seed
+    def __init__(self, directory=CACHE_DIR, max_entries=MEMORY_ENTRIES, max_bytes=DISK_SIZE_CAP):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    # cached rows of key (read only), None if it is in neither tier
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        path = self._path(key)
+        try:
+            rows = np.load(path)
+        except (OSError, ValueError, EOFError):  # missing, or cut by a crash
+            return None
+        os.utime(path)  # the modification time orders the files for eviction
+        self._remember(key, rows)
+        return rows
+
+    def _remember(self, key, rows):
+        rows.flags.writeable = False
+        self.memory[key] = rows
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def put(self, key, rows):
+        rows = np.array(rows, dtype=float)
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, rows)
+        os.replace(temp_path, path)
+        self._remember(key, rows)
+        self._evict(keep=path)
+        return rows
+
+    # delete the least recently used files until the others fit in max_bytes
+    def _evict(self, keep=None):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".npy")]
+        files = sorted((os.stat(path).st_mtime, os.path.getsize(path), path) for path in paths)
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in files:
+            if size <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            size -= file_size
+
+    def clear(self):
+        self.memory.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                os.remove(os.path.join(self.directory, name))
+
+    # result rows of travelers 0 to nb_travelers of simulation.iter_simulate(simulate_one, nb_travelers, seed, ...).
+    # simulate_one returns a Traveler.get_scores or Player.get_max_scores result (run_traveler, run_player...)
+    def simulate(self, simulate_one, nb_travelers, seed, nb_workers=None, **kwargs):
+        if seed is None:
+            raise ValueError("only seeded sweeps can be cached")
+        key = config_key(simulate_one, seed, kwargs)
+        rows = self.get(key)
+        if rows is not None and len(rows) >= nb_travelers:
+            self.hits += 1
+            return rows[:nb_travelers]
+
+        if rows is None:
+            self.misses += 1
+            rows = np.zeros((0, len(TYPES) + 1))
+        else:
+            self.partial_hits += 1
+        results = iter_simulate(
+            simulate_one, nb_travelers - len(rows), seed, nb_workers, first_traveler=len(rows), **kwargs
+        )
+        return self.put(key, np.concatenate([rows, result_rows(list(results))]))
+
+    def summary(self, simulate_one, nb_travelers, seed, nb_workers=None, quantiles=(0.1, 0.5, 0.9), **kwargs):
+        return summarize(self.simulate(simulate_one, nb_travelers, seed, nb_workers, **kwargs), quantiles)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from simulation import run_traveler, simulate
+
+    desired_main_statuses = {"Flower": "HP", "Plume": "ATK", "Sands": "ATK%", "Goblet": "PYR_DMG", "Circlet": "CR"}
+    config = dict(
+        desired_main_statuses=desired_main_statuses,
+        desired_sub_status="ATK%",
+        weeks=4,
+        free_artifacts={artifact_type: 0 for artifact_type in TYPES},
+    )
+    cache = ResultCache(tempfile.mkdtemp(), max_bytes=20000)
+    for nb_travelers in (200, 200, 500):
+        start = time.perf_counter()
+        summary = cache.summary(run_traveler, nb_travelers, 0, nb_workers=1, **config)
+        print(
+            f"{nb_travelers} travelers: {(time.perf_counter() - start) * 1e3:.1f} ms, mean {summary['mean']:.2f}"
+            f" (hits {cache.hits}, partial hits {cache.partial_hits}, misses {cache.misses})"
+        )
+    expected = result_rows(simulate(run_traveler, 500, 0, nb_workers=1, **config))
+    assert np.array_equal(cache.simulate(run_traveler, 500, 0, **config), expected, equal_nan=True)
+
+    # a new cache on the same directory reads the file, other weeks are another key and evict the older file
+    cache = ResultCache(cache.directory, max_bytes=20000)
+    cache.simulate(run_traveler, 500, 0, **config)
+    cache.simulate(run_traveler, 500, 0, nb_workers=1, **dict(config, weeks=2))
+    print(f"disk hits {cache.hits}, files {sorted(os.listdir(cache.directory))}")
@@ -0,0 +1,141 @@
+import functools
+
+import numpy as np
+from artifact import MAX_LEVEL, SUB_STATS, SUB_STATS_ROLLS_LIST, SUB_STATS_TABLES, score_weights
+
+# rolls have 2 decimals and the weights of the status names are multiples of 1/4, so their scores are exact in this
+# unit. A scoring.ScoreWeights with other weights has each roll and the current score rounded to it, its scores are
+# then off by at most MAX_ROUNDING_ERROR
+SCORE_UNIT = 1 / 400
+MAX_ROUNDING_ERROR = (MAX_LEVEL // 4 + 1) * SCORE_UNIT / 2
+CACHE_SIZE = 4096
+
+
+class ScoreDistribution:
+    # exact distribution of a score: possible scores in increasing order and their probabilities
+    def __init__(self, scores, probabilities):
+        self.scores = scores
+        self.probabilities = probabilities
+        self.cdf = np.cumsum(probabilities)
+
+    def mean(self):
+        return float(self.scores @ self.probabilities)
+
+    def std(self):
+        return float(np.sqrt(((self.scores - self.mean()) ** 2) @ self.probabilities))
+
+    # smallest score s with P(score <= s) >= q
+    def quantile(self, q):
+        return float(self.scores[min(np.searchsorted(self.cdf, q - 1e-12), len(self.scores) - 1)])
+
+    def prob_at_least(self, score):
+        return float(self.probabilities[self.scores >= score - SCORE_UNIT / 2].sum())
+
+
+def _units(score):
+    return int(round(score / SCORE_UNIT))
+
+
+def _convolve(a, b):
+    result = {}
+    for x, p in a.items():
+        for y, q in b.items():
+            result[x + y] = result.get(x + y, 0) + p * q
+    return result
+
+
+# score added by one roll of the stat, one entry per roll tier
+def _roll_distribution(stat, status_name):
+    weight = score_weights(status_name)[SUB_STATS.index(stat)]
+    result = {}
+    for roll in SUB_STATS_ROLLS_LIST[SUB_STATS.index(stat)]:
+        result[_units(weight * roll)] = result.get(_units(weight * roll), 0) + 1 / 4
+    return result
+
+
+# distribution of the score gained by nb_upgrades upgrades, as {score in SCORE_UNIT: probability}.
+# main_status is only needed when the artifact has 3 substats and the first upgrade adds the 4th one
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _increment_distribution(main_status, stats, nb_upgrades, status_name):
+    if nb_upgrades == 0:
+        return {0: 1.0}
+    if len(stats) == 3:
+        result = {}
+        new_stats, cum_weights = SUB_STATS_TABLES[main_status, stats]
+        for stat, probability in zip(new_stats, np.diff([0] + cum_weights) / cum_weights[-1]):
+            rest = _increment_distribution(None, stats | {stat}, nb_upgrades - 1, status_name)
+            for x, p in _convolve(_roll_distribution(stat, status_name), rest).items():
+                result[x] = result.get(x, 0) + probability * p
+        return result
+
+    # each upgrade rolls one of the 4 substats with the same probability
+    upgrade = {}
+    for stat in stats:
+        for x, p in _roll_distribution(stat, status_name).items():
+            upgrade[x] = upgrade.get(x, 0) + p / 4
+    return _convolve(upgrade, _increment_distribution(None, stats, nb_upgrades - 1, status_name))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _increment_arrays(main_status, stats, nb_upgrades, status_name):
+    distribution = _increment_distribution(main_status, stats, nb_upgrades, status_name)
+    units = np.array(sorted(distribution))
+    return units, np.array([distribution[x] for x in units])
+
+
+# exact distribution of artifact.get_score(status_name) once the artifact is leveled up to level, up to
+# MAX_ROUNDING_ERROR for weights that are not multiples of 1/4 (see SCORE_UNIT). Results are cached on (main status,
+# substat set, upgrades left, status_name) and shifted by the current score
+def score_distribution(artifact, status_name, level=MAX_LEVEL):
+    nb_upgrades = max(min(level, MAX_LEVEL) // 4 - artifact.level // 4, 0)
+    stats = frozenset(artifact.sub_status)
+    units, probabilities = _increment_arrays(
+        artifact.main_status if len(stats) == 3 else None, stats, nb_upgrades, status_name
+    )
+    return ScoreDistribution((units + _units(artifact.get_score(status_name))) * SCORE_UNIT, probabilities)
+
+
+if __name__ == "__main__":
+    # exact distribution against Monte Carlo for a few random artifacts
+    import copy
+    import random
+    import timeit
+
+    from artifact import Artifact
+
+    random.seed(0)
+    for _ in range(3):
+        artifact = Artifact()
+        distribution = score_distribution(artifact, "ATK%")
+        samples = []
+        for _ in range(20000):
+            leveled = copy.copy(artifact)
+            leveled.sub_status = dict(artifact.sub_status)
+            leveled.level_up(20)
+            samples.append(leveled.get_score("ATK%"))
+        print(artifact)
+        print(
+            f"  exact mean {distribution.mean():.3f} std {distribution.std():.3f} "
+            f"q10/50/90 {[round(distribution.quantile(q), 2) for q in (0.1, 0.5, 0.9)]}"
+        )
+        print(
+            f"  Monte Carlo mean {np.mean(samples):.3f} std {np.std(samples):.3f} "
+            f"q10/50/90 {[round(float(np.quantile(samples, q)), 2) for q in (0.1, 0.5, 0.9)]}"
+        )
+    # weights that are not multiples of 1/4: every leveled score is within MAX_ROUNDING_ERROR of a score of the
+    # distribution
+    from scoring import ScoreWeights
+
+    weights = ScoreWeights({"CR": 2.13, "CD": 0.97, "ATK%": 0.371, "EM": 0.013})
+    for _ in range(20):
+        artifact = Artifact()
+        scores = score_distribution(artifact, weights).scores
+        for _ in range(200):
+            leveled = artifact.copy()
+            leveled.level_up(20)
+            assert np.abs(scores - leveled.get_score(weights)).min() <= MAX_ROUNDING_ERROR + 1e-9
+            assert abs(score_distribution(leveled, weights).mean() - leveled.get_score(weights)) <= SCORE_UNIT / 2
+    print(f"arbitrary weights: scores within {MAX_ROUNDING_ERROR} of the distribution")
+
+    cached = timeit.timeit(lambda: score_distribution(artifact, "ATK%"), number=1000) / 1000
+    print(f"cached query {cached * 1e6:.1f} us")
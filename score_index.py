@@ -0,0 +1,93 @@
+import heapq
+
+MAX_LEVEL = 20
+
+
+class ScoreIndex:
+    # artifacts of one bag ordered by (-score, position in the bag), which is the order of
+    # sorted(bag, key=score, reverse=True). Scores are kept in two heaps with lazy deletion, one with every artifact
+    # and one with the artifacts that can still be leveled, so adding or leveling an artifact costs O(log n).
+    # scores are the scores of artifacts when they are already known (scoring.score_bag), the heaps are then built in
+    # O(n) without calling get_score
+    def __init__(self, get_score, artifacts=(), scores=None):
+        self.get_score = get_score
+        self.artifacts = []
+        self.positions = {}  # id of artifact -> position
+        self.keys = []
+        self._all = []
+        self._unmaxed = []
+        if scores is None:
+            for artifact in artifacts:
+                self.add(artifact)
+            return
+
+        self.artifacts = list(artifacts)
+        self.positions = {id(artifact): position for position, artifact in enumerate(self.artifacts)}
+        self.keys = list(zip((-scores).tolist(), range(len(self.artifacts))))
+        self._all = list(self.keys)
+        self._unmaxed = [key for key, artifact in zip(self.keys, self.artifacts) if artifact.level < MAX_LEVEL]
+        heapq.heapify(self._all)
+        heapq.heapify(self._unmaxed)
+
+    def __len__(self):
+        return len(self.artifacts)
+
+    def add(self, artifact):
+        position = len(self.artifacts)
+        self.artifacts.append(artifact)
+        self.positions[id(artifact)] = position
+        self.keys.append((-self.get_score(artifact), position))
+        heapq.heappush(self._all, self.keys[position])
+        if artifact.level < MAX_LEVEL:
+            heapq.heappush(self._unmaxed, self.keys[position])
+        return position
+
+    # put artifact, a copy with the same score, in place of the artifact at position
+    def replace(self, position, artifact):
+        del self.positions[id(self.artifacts[position])]
+        self.artifacts[position] = artifact
+        self.positions[id(artifact)] = position
+
+    # to call after the artifact was leveled up
+    def update(self, artifact):
+        position = self.positions[id(artifact)]
+        key = (-self.get_score(artifact), position)
+        if key == self.keys[position]:
+            return  # same score, the entries in the heaps are still valid
+        self.keys[position] = key
+        heapq.heappush(self._all, key)
+        if artifact.level < MAX_LEVEL:
+            heapq.heappush(self._unmaxed, key)
+
+    def _is_valid(self, key, unmaxed):
+        position = key[1]
+        return self.keys[position] == key and not (unmaxed and self.artifacts[position].level >= MAX_LEVEL)
+
+    def _clean(self, heap, unmaxed):
+        while heap and not self._is_valid(heap[0], unmaxed):
+            heapq.heappop(heap)
+
+    def _best_position(self):
+        self._clean(self._all, False)
+        return self._all[0][1] if self._all else None
+
+    # artifact with the best score, None if the bag is empty
+    def best(self):
+        position = self._best_position()
+        return None if position is None else self.artifacts[position]
+
+    # best artifact below max level other than the best one, None if there is none
+    def best_unmaxed_runner_up(self):
+        best = self._best_position()
+        self._clean(self._unmaxed, True)
+        if not self._unmaxed or self._unmaxed[0][1] != best:
+            return self.artifacts[self._unmaxed[0][1]] if self._unmaxed else None
+        top = heapq.heappop(self._unmaxed)
+        self._clean(self._unmaxed, True)
+        runner_up = self.artifacts[self._unmaxed[0][1]] if self._unmaxed else None
+        heapq.heappush(self._unmaxed, top)
+        return runner_up
+
+    # score of the artifact when it was added or last updated
+    def score(self, artifact):
+        return -self.keys[self.positions[id(artifact)]][0]
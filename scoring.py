@@ -0,0 +1,86 @@
+import numpy as np
+from artifact import SUB_STATS, ArtifactBatch, score_weights
+
+
+class ScoreWeights:
+    # score of an artifact as a weighted sum of its substats, usable everywhere a status name is (get_score,
+    # get_scores, Traveler and Player desired_sub_status...). Substats missing from weights count for 0
+    def __init__(self, weights):
+        unknown = set(weights) - set(SUB_STATS)
+        if unknown:
+            raise ValueError(f"unknown substats {sorted(unknown)}")
+        self.weights = {stat: float(weights[stat]) for stat in SUB_STATS if weights.get(stat, 0) != 0}
+        self._key = tuple(sorted(self.weights.items()))
+        # weight per substat code, the extra last entry is for empty slots
+        self.vector = np.array([self.weights.get(stat, 0.0) for stat in SUB_STATS] + [0.0])
+        self.vector.flags.writeable = False
+
+    # the weights of Artifact.get_score(status_name): CR x2, CD and the status (EM / 4)
+    @classmethod
+    def for_status(cls, status_name):
+        return cls(dict(zip(SUB_STATS, score_weights(status_name)[:-1])))
+
+    def __repr__(self):
+        return f"ScoreWeights({self.weights})"
+
+    def __eq__(self, other):
+        if not isinstance(other, ScoreWeights):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+
+# scores of every artifact of a bag as an array, in bag order. A batch is scored with one dot product over its substat
+# arrays, a list with the cached score of each artifact
+def score_bag(artifacts, status_name):
+    if isinstance(artifacts, ArtifactBatch):
+        return artifacts.get_scores(status_name)
+    return np.fromiter((a.get_score(status_name) for a in artifacts), dtype=float, count=len(artifacts))
+
+
+# Artifact.get_max_score of every artifact of a bag as an array, in bag order
+def upper_bounds(artifacts, status_name):
+    if isinstance(artifacts, ArtifactBatch):
+        return artifacts.get_max_scores(status_name)
+    return np.fromiter((a.get_max_score(status_name) for a in artifacts), dtype=float, count=len(artifacts))
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    from artifact import Artifact, CompactArtifact
+
+    rng = random.Random(0)
+    artifacts = [Artifact(rng) for _ in range(2000)]
+    for artifact in artifacts:
+        artifact.level_up(20)
+    compact = [CompactArtifact.from_artifact(a) for a in artifacts]
+    batch = ArtifactBatch(2000, np.random.RandomState(0))
+    batch.level_up(20)
+
+    weights = ScoreWeights.for_status("ATK%")
+    for bag in (artifacts, compact, batch):
+        assert np.allclose(score_bag(bag, "ATK%"), score_bag(bag, weights))
+    crit_only = ScoreWeights({"CR": 2, "CD": 1})
+    assert np.allclose(score_bag(artifacts, crit_only), score_bag(compact, crit_only))
+    print("configurable weights agree with the status scores")
+
+    # no artifact leveled to 20 goes past its bound, and batch bounds are the ones of the artifacts
+    fresh = [Artifact(rng) for _ in range(2000)]
+    for artifact in fresh[::2]:
+        artifact.level_up(4)
+    bounds = upper_bounds(fresh, "ATK%")
+    assert np.allclose(bounds, upper_bounds(ArtifactBatch.from_artifacts(fresh), "ATK%"))
+    assert np.allclose(bounds, upper_bounds([CompactArtifact.from_artifact(a) for a in fresh], "ATK%"))
+    for artifact in fresh:
+        artifact.level_up(20)
+    assert (score_bag(fresh, "ATK%") <= bounds + 1e-9).all()
+    print("upper bounds hold")
+
+    for name, bag in (("Artifact", artifacts), ("CompactArtifact", compact), ("ArtifactBatch", batch)):
+        uncached = timeit.timeit(lambda: score_bag(bag, ScoreWeights({"CR": 2, "CD": rng.random()})), number=20) / 20
+        cached = timeit.timeit(lambda: score_bag(bag, "ATK%"), number=20) / 20
+        print(f"{name:16s} score a bag of {len(bag)}: {uncached * 1e3:.3f} ms, cached {cached * 1e3:.3f} ms")
@@ -0,0 +1,229 @@
+import copy
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from checkpoint import CHECKPOINT_EVERY, SweepCheckpoint
+from corpus import MANIFEST, DropCorpus
+from player import Player
+from traveler import Traveler
+from upgrade_value import install_tables, loaded_tables, upgrade_table
+
+CHUNK_SIZE = 50  # travelers sent to a worker at once
+
+_CORPORA = {}  # directory -> (modification time of its manifest, DropCorpus opened by this process)
+
+
+# one traveler farming for some weeks, returns the result of Traveler.get_scores
+def run_traveler(
+    seed, desired_main_statuses, desired_sub_status, weeks, free_artifacts, percentage=50, order="min_diff", **options
+):
+    traveler = Traveler(desired_main_statuses, desired_sub_status, seed=seed, **options)
+    traveler.spend_weeks(weeks)
+    traveler.levelup_4(percentage)
+    traveler.levelup_until_exp(order)
+    return traveler.get_scores(free_artifacts)
+
+
+# run_traveler on drops read from the corpus in corpus_directory (see corpus.write_corpus) instead of generated ones.
+# Traveler i of a sweep (the last entry of the spawn key of its seed) farms the domain runs i * runs_per_traveler to
+# (i + 1) * runs_per_traveler, so sweeps with the same corpus get the same drops whatever their seed or policy
+def run_corpus_traveler(
+    seed,
+    corpus_directory,
+    runs_per_traveler,
+    desired_main_statuses,
+    desired_sub_status,
+    weeks,
+    free_artifacts,
+    percentage=50,
+    order="min_diff",
+    **options,
+):
+    version = os.stat(os.path.join(corpus_directory, MANIFEST)).st_mtime_ns  # the corpus was written again since
+    if _CORPORA.get(corpus_directory, (None,))[0] != version:
+        _CORPORA[corpus_directory] = version, DropCorpus(corpus_directory)
+    drops = _CORPORA[corpus_directory][1].traveler_stream(seed.spawn_key[-1], runs_per_traveler)
+    traveler = Traveler(desired_main_statuses, desired_sub_status, seed=seed, drops=drops, **options)
+    traveler.spend_weeks(weeks)
+    traveler.levelup_4(percentage)
+    traveler.levelup_until_exp(order)
+    return traveler.get_scores(free_artifacts)
+
+
+# one traveler farming for some weeks and several builds evaluated on the same drops, returns the result of
+# Traveler.get_scores of each build. A build is a dict of desired_main_statuses, desired_sub_status, free_artifacts and
+# optionally percentage and order (of levelup_until_exp). The drops are the ones run_traveler generates with the same
+# seed, the leveling of build i uses its own child of the seed
+def run_builds(seed, builds, weeks, **options):
+    if options.get("lazy_drops"):
+        raise ValueError("lazy drops depend on the build and can not be shared")
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    pool = Traveler(None, None, seed=seed, **options)
+    pool.spend_weeks(weeks)
+
+    results = []
+    for build, build_seed in zip(builds, seed.spawn(len(builds))):
+        traveler = Traveler.from_pool(pool, build["desired_main_statuses"], build["desired_sub_status"], build_seed)
+        traveler.levelup_4(build.get("percentage", 50))
+        traveler.levelup_until_exp(build.get("order", "min_diff"))
+        results.append(traveler.get_scores(build["free_artifacts"]))
+    return results
+
+
+# run_traveler for every number of weeks of horizons in one pass, returns {weeks: result of Traveler.get_scores}.
+# The traveler farms up to each horizon in turn, carrying resin and exp over, and at each horizon a copy of it
+# (Traveler.from_pool) levels up the artifacts farmed so far. Each result has the distribution of
+# run_traveler(weeks=weeks)
+def run_traveler_horizons(
+    seed, desired_main_statuses, desired_sub_status, horizons, free_artifacts, percentage=50, **options
+):
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    traveler = Traveler(desired_main_statuses, desired_sub_status, seed=seed, **options)
+    horizons = sorted(set(horizons))
+    results = {}
+    for weeks, horizon_seed in zip(horizons, seed.spawn(len(horizons))):
+        traveler.spend_weeks(weeks - max(results, default=0))
+        leveled = Traveler.from_pool(traveler, desired_main_statuses, desired_sub_status, horizon_seed)
+        leveled.levelup_4(percentage)
+        leveled.levelup_until_exp()
+        results[weeks] = leveled.get_scores(free_artifacts)
+    return results
+
+
+# one player farming for some weeks, returns the result of Player.get_max_scores
+def run_player(seed, desired_main_statuses, desired_sub_status, weeks, **options):
+    player = Player(desired_main_statuses, desired_sub_status, seed=seed, **options)
+    player.spend_weeks(weeks)
+    player.levelup_until_exp()
+    return player.get_max_scores()
+
+
+# run_player for every number of weeks of horizons in one pass, returns {weeks: result of Player.get_max_scores}.
+# The player farms up to each horizon in turn and at each horizon a copy of it, with its own random state, levels up
+def run_player_horizons(seed, desired_main_statuses, desired_sub_status, horizons, **options):
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    player = Player(desired_main_statuses, desired_sub_status, seed=seed, **options)
+    horizons = sorted(set(horizons))
+    results = {}
+    for weeks, horizon_seed in zip(horizons, seed.spawn(len(horizons))):
+        player.spend_weeks(weeks - max(results, default=0))
+        leveled = copy.deepcopy(player)
+        leveled.rng.seed(int.from_bytes(horizon_seed.generate_state(4).tobytes(), "little"))  # shared by its artifacts
+        leveled.levelup_until_exp()
+        results[weeks] = leveled.get_max_scores()
+    return results
+
+
+def _run_chunk(simulate_one, seeds, kwargs):
+    return [simulate_one(seed, **kwargs) for seed in seeds]
+
+
+# seeds of travelers start to stop, the same as SeedSequence(seed).spawn(nb_travelers)[start:stop] without creating
+# the seeds of the other travelers
+def traveler_seeds(seed, start, stop):
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return [
+        np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (i,), pool_size=root.pool_size)
+        for i in range(start, stop)
+    ]
+
+
+# build the upgrade value table a sweep with the "upgrade_value" order (alone or among policy.POLICIES) needs once
+# here, instead of once per worker
+def _prepare_tables(kwargs):
+    orders = {kwargs.get("order")} | {order for _, order in kwargs.get("policies", ())}
+    if "upgrade_value" in orders:
+        upgrade_table(kwargs["desired_sub_status"], kwargs.get("upgrade_table_directory"))
+
+
+# results of each chunk, in chunk order
+def _iter_chunks(simulate_one, root, chunks, nb_workers, kwargs):
+    if nb_workers == 1:
+        for start, stop in chunks:
+            yield _run_chunk(simulate_one, traveler_seeds(root, start, stop), kwargs)
+        return
+
+    _prepare_tables(kwargs)
+    with ProcessPoolExecutor(nb_workers, initializer=install_tables, initargs=(loaded_tables(),)) as executor:
+        pending = deque()
+        for start, stop in chunks:
+            pending.append(executor.submit(_run_chunk, simulate_one, traveler_seeds(root, start, stop), kwargs))
+            if len(pending) >= 2 * nb_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# run simulate_one (run_traveler, run_player...) for nb_travelers travelers over a process pool and yield the results
+# in traveler order. Every traveler gets its own child of SeedSequence(seed), so the results only depend on seed and
+# not on nb_workers or chunk_size. At most 2 chunks per worker are in flight, so memory does not grow with
+# nb_travelers. With first_traveler the travelers first_traveler to first_traveler + nb_travelers of the same seed are
+# run instead, to add travelers to a previous sweep.
+# With checkpoint_path the results are saved there every checkpoint_every chunks, and a sweep started again with the
+# same arguments yields the saved results then resumes after the last saved chunk
+def iter_simulate(
+    simulate_one,
+    nb_travelers,
+    seed=None,
+    nb_workers=None,
+    chunk_size=CHUNK_SIZE,
+    checkpoint_path=None,
+    checkpoint_every=CHECKPOINT_EVERY,
+    first_traveler=0,
+    **kwargs,
+):
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    nb_workers = nb_workers or os.cpu_count()
+    checkpoint = None
+    nb_done = 0
+    if checkpoint_path is not None:
+        if seed is None:
+            raise ValueError("a sweep needs a seed to be resumed")
+        header = {
+            "simulate_one": getattr(simulate_one, "__qualname__", type(simulate_one).__name__),
+            "nb_travelers": nb_travelers,
+            "first_traveler": first_traveler,
+            "entropy": root.entropy,
+            "spawn_key": root.spawn_key,
+            "kwargs": repr(sorted(kwargs.items())),
+        }
+        checkpoint = SweepCheckpoint(checkpoint_path, header, checkpoint_every)
+        nb_done = checkpoint.nb_done
+        yield from checkpoint.iter_results()
+
+    end = first_traveler + nb_travelers
+    chunks = ((start, min(start + chunk_size, end)) for start in range(first_traveler + nb_done, end, chunk_size))
+    for results in _iter_chunks(simulate_one, root, chunks, nb_workers, kwargs):
+        if checkpoint is not None:
+            checkpoint.add(results)
+        yield from results
+    if checkpoint is not None:
+        checkpoint.flush()
+
+
+def simulate(
+    simulate_one,
+    nb_travelers,
+    seed=None,
+    nb_workers=None,
+    chunk_size=CHUNK_SIZE,
+    checkpoint_path=None,
+    checkpoint_every=CHECKPOINT_EVERY,
+    first_traveler=0,
+    **kwargs,
+):
+    return list(
+        iter_simulate(
+            simulate_one,
+            nb_travelers,
+            seed,
+            nb_workers,
+            chunk_size,
+            checkpoint_path,
+            checkpoint_every,
+            first_traveler,
+            **kwargs,
+        )
+    )
@@ -1,21 +1,85 @@
+import random
+
 import numpy as np
-from artifact import Artifact, TYPES
+from artifact import MAIN_STATS, TYPES, Artifact, ArtifactBatch, main_status_probability, make_rngs
+from score_distribution import SCORE_UNIT, score_distribution
+from score_index import ScoreIndex
+from scoring import score_bag, upper_bounds
+from upgrade_value import upgrade_table
 
 COST_LEVEL_20 = 270475
 COST_LEVEL_4 = 5900
 RESIN_PER_DOMAIN = 20
 EXP_PER_DAY = 101957  # https://wikiwiki.jp/genshinwiki/%E7%A8%BC%E3%81%8E#c1dff353
 PROB_DROP_TWO_ARTIFACT = 0.06
+# how levelup_until_exp picks the next artifact among the best unmaxed runner-up of each type: the one closest to the
+# best artifact of its type, the one with the best score, the one most likely to beat the best of its type at
+# level 20, or the one with the largest expected improvement over the best of its type per exp (upgrade_value table)
+LEVELING_ORDERS = ("min_diff", "max_score", "prob_improve", "upgrade_value")
 
 
 class Traveler:
-    def __init__(self, desired_main_statuses, desired_sub_status):
+    def __init__(
+        self,
+        desired_main_statuses,
+        desired_sub_status,
+        use_batch=False,
+        artifact_class=Artifact,
+        seed=None,
+        lazy_drops=False,
+        drops=None,
+        prune_dominated=False,
+        upgrade_table_directory=None,
+    ):
         self.resin = 0
-        self.bag = {artifact_type: [] for artifact_type in TYPES}
+        self.exp = 0
+        # with lazy_drops only the drops that survive the set and main status filters are generated
+        self.lazy_drops = lazy_drops
+        # drops read from a corpus.DropStream instead of generated, the same for every traveler given that stream
+        self.drops = drops
+        # with prune_dominated the artifacts that can not beat the best of their bag even at level 20 are dropped when
+        # drops arrive, after levelup_4 and when the best of a bag improves. This saves memory, not time: bags end
+        # about half as large over a year of weekly leveling but keep growing, since get_max_score is exact and a fresh
+        # drop with crit substats can always still beat the best, and leveling was already cheap with the score index
+        self.prune_dominated = prune_dominated
+        # where the "upgrade_value" order keeps its tables (see upgrade_value.upgrade_table), None builds them in memory
+        self.upgrade_table_directory = upgrade_table_directory
+        # without seed the global np.random and random states are used
+        self.rng, self.artifact_rng = (np.random, random) if seed is None else make_rngs(seed)
+        # with use_batch each bag is an ArtifactBatch instead of a list of artifact_class
+        self.use_batch = use_batch
+        self.artifact_class = artifact_class
+        self.bag = {artifact_type: ArtifactBatch(rng=self.rng) if use_batch else [] for artifact_type in TYPES}
         self.best_set = {artifact_type: None for artifact_type in TYPES}
+        # score index of each bag, built when first needed and dropped when the bag is replaced
+        self.score_index = {artifact_type: None for artifact_type in TYPES}
+        # ids of the artifacts also in the bags of other travelers (see from_pool), copied before they are leveled
+        self.shared = set()
+        # without desired_main_statuses the bag keeps every main status, as a pool of drops for from_pool
         self.desired_main_statuses = desired_main_statuses
         self.desired_sub_status = desired_sub_status
 
+    # traveler of one build that starts with the drops and exp of pool instead of farming its own. pool is a Traveler
+    # without desired_main_statuses to share its drops between builds, or a traveler of the same build to level a
+    # snapshot of it. The bags are filtered views of the pool: list bags share the artifacts with the pool and copy
+    # them the first time they are leveled, batch bags are copied by the filter. Leveling uses the rngs of seed so
+    # builds of the same pool do not depend on each other
+    @classmethod
+    def from_pool(cls, pool, desired_main_statuses, desired_sub_status, seed=None):
+        traveler = cls(desired_main_statuses, desired_sub_status, pool.use_batch, pool.artifact_class, seed)
+        traveler.prune_dominated = pool.prune_dominated
+        traveler.upgrade_table_directory = pool.upgrade_table_directory
+        traveler.resin = pool.resin
+        traveler.exp = pool.exp
+        traveler.bag = dict(pool.bag)
+        traveler._filter_main_status()
+        for artifacts in traveler.bag.values():
+            if isinstance(artifacts, ArtifactBatch):
+                artifacts.rng = traveler.rng
+            else:
+                traveler.shared.update(id(artifact) for artifact in artifacts)
+        return traveler
+
     def __str__(self):
         result = []
         for artifact_type in TYPES:
@@ -26,22 +90,93 @@ class Traveler:
         return "\n".join(result)
 
     def go_domain(self, nb_pull):
+        if self.drops is not None:
+            self._add_drops(self.drops.take(nb_pull, self.rng))
+            return
+        if self.lazy_drops:
+            self._go_domain_lazy(nb_pull)
+            return
+        if self.use_batch:
+            self._go_domain_batch(nb_pull)
+            return
         additional_pull = sum(
-            [np.random.choice([0, 1], p=[1 - PROB_DROP_TWO_ARTIFACT, PROB_DROP_TWO_ARTIFACT]) for _ in range(nb_pull)]
+            [self.rng.choice([0, 1], p=[1 - PROB_DROP_TWO_ARTIFACT, PROB_DROP_TWO_ARTIFACT]) for _ in range(nb_pull)]
         )
-        artifacts = [Artifact() for _ in range(nb_pull + additional_pull)]
+        artifacts = [self.artifact_class(self.artifact_rng) for _ in range(nb_pull + additional_pull)]
         for artifact in artifacts:
             # Filter by artifact type (assumes index 1 is undesired type)
-            if np.random.randint(2) == 1:
+            if self.rng.randint(2) == 1:
                 continue
             self.bag[artifact.type].append(artifact)
         self._filter_main_status()
 
+    def _go_domain_batch(self, nb_pull):
+        additional_pull = self.rng.binomial(nb_pull, PROB_DROP_TWO_ARTIFACT)
+        self._add_drops(ArtifactBatch(nb_pull + additional_pull, self.rng))
+
+    # put a batch of drops in the bags, list bags get the ones with the desired main status as artifact_class
+    def _add_drops(self, artifacts):
+        artifacts = artifacts[artifacts.set == 0]  # Filter by artifact set (assumes set 1 is undesired)
+        for type_code, artifact_type in enumerate(TYPES):
+            drops = artifacts[artifacts.type == type_code]
+            if self.use_batch:
+                self.bag[artifact_type] = ArtifactBatch.concatenate([self.bag[artifact_type], drops])
+                continue
+            if self.desired_main_statuses is not None:
+                drops = drops[drops.main_status == MAIN_STATS.index(self.desired_main_statuses[artifact_type])]
+            self.bag[artifact_type].extend(drops.to_artifacts(self.artifact_class, self.artifact_rng))
+        self._filter_main_status()
+
+    # same distribution as go_domain: each drop is kept with probability 1/2 (set) * 1/5 (type) * probability of the
+    # desired main status, so the number kept per type is multinomial and only those get substats
+    def _go_domain_lazy(self, nb_pull):
+        nb_drops = nb_pull + self.rng.binomial(nb_pull, PROB_DROP_TWO_ARTIFACT)
+        probabilities = [
+            0.5 / len(TYPES) * main_status_probability(artifact_type, self.desired_main_statuses[artifact_type])
+            for artifact_type in TYPES
+        ]
+        counts = self.rng.multinomial(nb_drops, probabilities + [1 - sum(probabilities)])
+        for artifact_type, count in zip(TYPES, counts):
+            main_status = self.desired_main_statuses[artifact_type]
+            if self.use_batch:
+                artifacts = ArtifactBatch(count, self.rng, artifact_type, main_status)
+                self.bag[artifact_type] = ArtifactBatch.concatenate([self.bag[artifact_type], artifacts])
+            else:
+                self.bag[artifact_type].extend(
+                    self.artifact_class(self.artifact_rng, artifact_type, main_status) for _ in range(count)
+                )
+        self._filter_main_status()
+
     def _filter_main_status(self):
+        if self.desired_main_statuses is None:
+            return
         for artifact_type, artifacts in self.bag.items():
+            if isinstance(artifacts, ArtifactBatch):
+                main_status = MAIN_STATS.index(self.desired_main_statuses[artifact_type])
+                self.bag[artifact_type] = artifacts[artifacts.main_status == main_status]
+                continue
             self.bag[artifact_type] = [
                 a for a in artifacts if a.main_status == self.desired_main_statuses[artifact_type]
             ]
+        self.score_index = {artifact_type: None for artifact_type in TYPES}
+        if self.prune_dominated:
+            self._prune(TYPES)
+
+    # drop the artifacts whose Artifact.get_max_score is below the score of the best of their bag, ties are kept
+    def _prune(self, artifact_types):
+        for artifact_type in artifact_types:
+            artifacts = self.bag[artifact_type]
+            if len(artifacts) < 2:
+                continue
+            best_score = score_bag(artifacts, self.desired_sub_status).max()
+            keep = upper_bounds(artifacts, self.desired_sub_status) >= best_score
+            if keep.all():
+                continue
+            if isinstance(artifacts, ArtifactBatch):
+                self.bag[artifact_type] = artifacts[keep]
+            else:
+                self.bag[artifact_type] = [artifact for artifact, kept in zip(artifacts, keep) if kept]
+            self.score_index[artifact_type] = None
 
     def spend_weeks(self, weeks):
         weekly_resin = (180 * 7 - 90 + 60) * weeks  # Natural resin recovery - Weekly boss cost + Transient Resin
@@ -50,17 +185,47 @@ class Traveler:
         self.resin -= nb_go_domain * RESIN_PER_DOMAIN
 
         self.go_domain(nb_go_domain)
-        self.exp = EXP_PER_DAY * 7 * weeks
+        self.exp += EXP_PER_DAY * 7 * weeks  # exp not spent yet carries over, like resin
 
     def get_artifact_score(self, x):
         return x.get_score(self.desired_sub_status)
 
+    def _get_score_index(self, artifact_type):
+        if self.score_index[artifact_type] is None:
+            artifacts = self.bag[artifact_type]
+            scores = score_bag(artifacts, self.desired_sub_status)
+            self.score_index[artifact_type] = ScoreIndex(self.get_artifact_score, artifacts, scores)
+        return self.score_index[artifact_type]
+
+    # artifacts[position], replaced by a copy of its own first if it is shared with other travelers
+    def _own(self, artifacts, position):
+        if id(artifacts[position]) in self.shared:
+            artifacts[position] = artifacts[position].copy(self.artifact_rng)
+        return artifacts[position]
+
+    def _level_up(self, artifact, levels):
+        score_index = self._get_score_index(artifact.type)
+        if id(artifact) in self.shared:  # the index was built from the bag, so positions are the same in both
+            position = score_index.positions[id(artifact)]
+            artifact = self._own(self.bag[artifact.type], position)
+            score_index.replace(position, artifact)
+        artifact.level_up(levels)
+        score_index.update(artifact)
+        if self.prune_dominated and score_index.best() is artifact:
+            self._prune([artifact.type])
+
+    # artifacts ordered from best to worst score, ties keep their bag order as in sorted(reverse=True)
+    def _sort_artifacts(self, artifacts):
+        order = np.argsort(-score_bag(artifacts, self.desired_sub_status), kind="stable")
+        return [artifacts[i] for i in order]
+
     def levelup_4(self, percentage):
         for artifact_type in TYPES:
             artifacts = self.bag[artifact_type]
 
-            temp_artifacts = sorted(artifacts, key=self.get_artifact_score, reverse=True)
-            self.bag[artifact_type] = temp_artifacts
+            temp_artifacts = self._sort_artifacts(artifacts)
+            if not isinstance(artifacts, ArtifactBatch):
+                self.bag[artifact_type] = temp_artifacts
 
             if len(temp_artifacts) < 3:
                 nb_levelup = len(temp_artifacts)
@@ -68,69 +233,79 @@ class Traveler:
             else:
                 nb_levelup = int(np.ceil(len(temp_artifacts) * percentage / 100))
 
-            for a in temp_artifacts[:nb_levelup]:
-                a.level_up(4)
+            for position in range(nb_levelup):
+                self._own(temp_artifacts, position).level_up(4)
                 self.exp -= COST_LEVEL_4
+            self.score_index[artifact_type] = None
+        if self.prune_dominated:
+            self._prune(TYPES)
+
+    # lower is leveled first
+    def _leveling_key(self, order, score_index, artifact):
+        best_score = score_index.score(score_index.best())
+        if order == "min_diff":
+            return best_score - score_index.score(artifact)
+        if order == "max_score":
+            return -score_index.score(artifact)
+        if order == "prob_improve":
+            return -score_distribution(artifact, self.desired_sub_status).prob_at_least(best_score + SCORE_UNIT)
+        if order == "upgrade_value":
+            cost = COST_LEVEL_20 - COST_LEVEL_4 if artifact.level == 4 else COST_LEVEL_20
+            table = upgrade_table(self.desired_sub_status, self.upgrade_table_directory)
+            return -table.expected_improvement(artifact, best_score) / cost
+        raise ValueError(f"unknown leveling order {order}, expected one of {LEVELING_ORDERS}")
 
-    def _get_max_diff_artifact(self):
+    def _get_max_diff_artifact(self, order="min_diff"):
         diffs = {artifact_type: 1000 for artifact_type in TYPES}
         max_diff_artifacts = {artifact_type: None for artifact_type in TYPES}
 
         for artifact_type in TYPES:
-            artifacts = self.bag[artifact_type]
-            if len(artifacts) < 1:
+            score_index = self._get_score_index(artifact_type)
+            if len(score_index) < 1:
                 continue
-            temp_artifacts = sorted(artifacts, key=self.get_artifact_score, reverse=True)
-            best_score = self.get_artifact_score(temp_artifacts[0])
-            for a in temp_artifacts[1:]:
-                if a.level < 20:
-                    next_score = self.get_artifact_score(a)
-                    max_diff_artifacts[artifact_type] = a
-                    diffs[artifact_type] = best_score - next_score
-                    break
+            a = score_index.best_unmaxed_runner_up()
+            if a is not None:
+                max_diff_artifacts[artifact_type] = a
+                diffs[artifact_type] = self._leveling_key(order, score_index, a)
 
         artifact_type = min(diffs, key=diffs.get)
-        if max_diff_artifacts[artifact_type] is None:
-            print(max_diff_artifacts)
-
         return max_diff_artifacts[artifact_type]
 
-    def levelup_until_exp(self):
+    def levelup_until_exp(self, order="min_diff"):
         # 1個目の聖遺物のレベルあげ
         for artifact_type in TYPES:
-            artifacts = self.bag[artifact_type]
-            if len(artifacts) > 0:
-                temp_artifacts = sorted(artifacts, key=self.get_artifact_score, reverse=True)
-                artifact = temp_artifacts[0]
+            artifact = self._get_score_index(artifact_type).best()
+            if artifact is not None:
                 if artifact.level == 4:
-                    artifact.level_up(16)
+                    self._level_up(artifact, 16)
                     self.exp -= COST_LEVEL_20 - COST_LEVEL_4
                 elif artifact.level == 0:
-                    artifact.level_up(20)
+                    self._level_up(artifact, 20)
                     self.exp -= COST_LEVEL_20
 
         # 2個目以降は伸びしろがありそうなやつを選んでレベルを上げる
         while True:
-            artifact = self._get_max_diff_artifact()
+            artifact = self._get_max_diff_artifact(order)
+            if artifact is None:  # every artifact is already at max level
+                break
+            # exp not spent carries over to the next week, so only an upgrade that is done is paid for
             if artifact.level == 4:
-                self.exp -= COST_LEVEL_20 - COST_LEVEL_4
-                if self.exp < 0:
+                if self.exp < COST_LEVEL_20 - COST_LEVEL_4:
                     break
-                artifact.level_up(16)
+                self.exp -= COST_LEVEL_20 - COST_LEVEL_4
+                self._level_up(artifact, 16)
             elif artifact.level == 0:
-                self.exp -= COST_LEVEL_20
-                if self.exp < 0:
+                if self.exp < COST_LEVEL_20:
                     break
-                artifact.level_up(20)
+                self.exp -= COST_LEVEL_20
+                self._level_up(artifact, 20)
 
     def get_scores(self, free_artifacts):
         scores = {artifact_type: -1 for artifact_type in TYPES}
         for artifact_type in TYPES:
-            artifacts = self.bag[artifact_type]
-            if len(artifacts) > 0:
-                temp_artifacts = sorted(artifacts, key=self.get_artifact_score, reverse=True)
-            best_artifact = temp_artifacts[0]
-            scores[artifact_type] = self.get_artifact_score(best_artifact)
+            score_index = self._get_score_index(artifact_type)
+            if len(score_index) > 0:
+                scores[artifact_type] = score_index.score(score_index.best())
 
         miss_type = []
         for artifact_type in TYPES:
@@ -143,8 +318,8 @@ class Traveler:
             scores[miss_type[0]] = free_artifacts[miss_type[0]]
         else:
             diff = np.array(list(free_artifacts.values())) - np.array(list(scores.values()))
-            free_type = np.argmax(diff)
-            if diff[free_type] < 0:
+            free_type = TYPES[np.argmax(diff)]
+            if diff[TYPES.index(free_type)] < 0:
                 return np.sum(list(scores.values())), scores  # フリー枠よりも厳選したやつのほうがスコアが良い
             else:
                 scores[free_type] = free_artifacts[free_type]
@@ -0,0 +1,166 @@
+import hashlib
+import itertools
+import os
+import tempfile
+
+import numpy as np
+from artifact import MAIN_STATS, MAX_LEVEL, SUB_STATS
+from score_distribution import SCORE_UNIT, _increment_arrays
+
+TABLE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "genshin-artifact-simulator", "upgrade_value")
+TABLE_VERSION = 1
+GAP_STEP = 0.25  # points between two columns of the table
+SUB_STATS_BITS = {stat: 1 << code for code, stat in enumerate(SUB_STATS)}
+
+_TABLES = {}  # (directory, status name) -> UpgradeTable loaded or built by this process
+
+
+# (main status code for artifacts with 3 substats else -1, bit mask of the substats, upgrades left to level 20): the
+# final score of an artifact is its current score plus an increment whose distribution only depends on this
+def canonical_state(artifact):
+    stats = artifact.sub_status
+    main_status = MAIN_STATS.index(artifact.main_status) if len(stats) == 3 else -1
+    return main_status, sum(SUB_STATS_BITS[stat] for stat in stats), MAX_LEVEL // 4 - artifact.level // 4
+
+
+# every state of an artifact at level 0 or 4: 3 substats only exist at level 0, the first upgrade adds the 4th
+def _level_0_4_states():
+    for main_status, stats in itertools.product(MAIN_STATS, itertools.combinations(SUB_STATS, 3)):
+        if main_status not in stats:
+            yield MAIN_STATS.index(main_status), stats, MAX_LEVEL // 4
+    for stats in itertools.combinations(SUB_STATS, 4):
+        for nb_upgrades in (MAX_LEVEL // 4 - 1, MAX_LEVEL // 4):
+            yield -1, stats, nb_upgrades
+
+
+def _increments(state, status_name):
+    main_status, stats, nb_upgrades = state
+    units, probabilities = _increment_arrays(
+        MAIN_STATS[main_status] if main_status >= 0 else None, frozenset(stats), nb_upgrades, status_name
+    )
+    return units * SCORE_UNIT, probabilities
+
+
+class UpgradeTable:
+    # expected improvement over a target score of leveling an artifact to 20, E[max(final score - target, 0)], for every
+    # canonical_state of level 0 and 4 artifacts (rows) and gap between the target and the current score, every
+    # gap_step points (columns) up to the largest increment, past which it is 0. Computed from the exact increment
+    # distributions of score_distribution
+    def __init__(self, status_name, keys, values, gap_step=GAP_STEP):
+        self.status_name = status_name
+        self.keys = keys
+        self.values = values
+        self.gap_step = gap_step
+        self.rows = {tuple(key): row for row, key in enumerate(keys.tolist())}
+
+    @classmethod
+    def build(cls, status_name, gap_step=GAP_STEP):
+        states = list(_level_0_4_states())
+        increments = [_increments(state, status_name) for state in states]
+        max_increment = max(float(units[-1]) for units, _ in increments)
+        gaps = np.arange(0, max_increment + 2 * gap_step, gap_step)
+        values = np.array([np.maximum(units[:, None] - gaps, 0).T @ p for units, p in increments], dtype=np.float32)
+        keys = np.array(
+            [(main_status, sum(SUB_STATS_BITS[s] for s in stats), nb) for main_status, stats, nb in states],
+            dtype=np.int16,
+        )
+        return cls(status_name, keys, values, gap_step)
+
+    # compressed .npz, about 200 kB per status name. Written to a temporary file of its own then renamed, so processes
+    # saving the same table at once do not clash
+    def save(self, path):
+        descriptor, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+        with os.fdopen(descriptor, "wb") as f:
+            np.savez_compressed(
+                f,
+                version=np.array(TABLE_VERSION),
+                status_name=np.array(_status_key(self.status_name)),
+                keys=self.keys,
+                values=self.values,
+                gap_step=np.array(self.gap_step),
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, status_name):
+        with np.load(path) as table:
+            if int(table["version"]) != TABLE_VERSION or str(table["status_name"]) != _status_key(status_name):
+                raise ValueError(f"{path} is not an upgrade value table of {status_name} version {TABLE_VERSION}")
+            return cls(status_name, table["keys"], table["values"], float(table["gap_step"]))
+
+    # expected improvement of leveling artifact to 20 over target, linear between two columns. States of other levels
+    # are not in the table and are computed exactly
+    def expected_improvement(self, artifact, target):
+        gap = (target - artifact.get_score(self.status_name)) / self.gap_step
+        state = canonical_state(artifact)
+        row = self.rows.get(state)
+        if row is None:
+            units, probabilities = _increments((state[0], list(artifact.sub_status), state[2]), self.status_name)
+            return float(np.maximum(units - gap * self.gap_step, 0) @ probabilities)
+        values = self.values[row]
+        if gap < 0:  # above the target: every increment counts in full
+            return float(values[0]) - gap * self.gap_step
+        column = int(gap)
+        if column >= len(values) - 1:
+            return 0.0
+        return float(values[column] + (values[column + 1] - values[column]) * (gap - column))
+
+
+# the status name as text, a ScoreWeights is named after its weights
+def _status_key(status_name):
+    if isinstance(status_name, str):
+        return status_name
+    return "weights_" + hashlib.sha256(repr(sorted(status_name.weights.items())).encode()).hexdigest()[:16]
+
+
+def table_path(status_name, directory=TABLE_DIR):
+    return os.path.join(directory, f"upgrade_value_{_status_key(status_name)}.npz")
+
+
+# UpgradeTable of status_name, built the first time it is needed in this process. With a directory (TABLE_DIR for
+# example) the table is loaded from there, or built and saved there if missing; without one nothing is written
+def upgrade_table(status_name, directory=None):
+    key = directory, status_name
+    if key not in _TABLES:
+        if directory is None:
+            _TABLES[key] = UpgradeTable.build(status_name)
+            return _TABLES[key]
+        path = table_path(status_name, directory)
+        try:
+            _TABLES[key] = UpgradeTable.load(path, status_name)
+        except (OSError, ValueError, KeyError):
+            _TABLES[key] = UpgradeTable.build(status_name)
+            os.makedirs(directory, exist_ok=True)
+            _TABLES[key].save(path)
+    return _TABLES[key]
+
+
+# the tables of this process, for install_tables in the workers of a process pool
+def loaded_tables():
+    return dict(_TABLES)
+
+
+def install_tables(tables):
+    _TABLES.update(tables)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="build the upgrade value tables used by the 'upgrade_value' order")
+    parser.add_argument("status_names", nargs="+", help="desired substats, e.g. ATK%% CR EM")
+    parser.add_argument("--directory", default=TABLE_DIR)
+    parser.add_argument("--gap-step", type=float, default=GAP_STEP)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for status_name in args.status_names:
+        start = time.perf_counter()
+        table = UpgradeTable.build(status_name, args.gap_step)
+        path = table_path(status_name, args.directory)
+        table.save(path)
+        print(
+            f"{status_name}: {table.values.shape[0]} states x {table.values.shape[1]} gaps in"
+            f" {time.perf_counter() - start:.1f} s, {os.path.getsize(path) / 1024:.0f} kB at {path}"
+        )